@@ -1,11 +1,18 @@
 # API.MX.client.py
 
 import aiohttp
-import time
+import asyncio
+from dataclasses import asdict, dataclass
+from time import time_ns
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from operator import itemgetter
 from typing import *
 
 from .mx_bypass.mexcTypes import (
     CreateOrderRequest,
+    OrderId,
     OpenType,
     OrderSide,
     OrderType,
@@ -16,24 +23,72 @@ from .mx_bypass.mexcTypes import (
     TriggerType,
     TriggerOrderRequest
 )
-from .mx_bypass.api import MexcFuturesAPI, ApiResponse
+from .mx_bypass.api import MexcFuturesAPI, ApiResponse, asdict_factory_with_enum_support
 
 if TYPE_CHECKING:
     from b_network import NetworkManager
     from c_log import UnifiedLogger
 
 
+# (position_side, side) → OrderSide
+_SIDE_MAP: Dict[Tuple[str, str], OrderSide] = {
+    ("LONG", "BUY"): OrderSide.OpenLong,
+    ("LONG", "SELL"): OrderSide.CloseLong,
+    ("SHORT", "BUY"): OrderSide.OpenShort,
+    ("SHORT", "SELL"): OrderSide.CloseShort,
+}
+_OPEN_TYPE_MAP: Dict[int, OpenType] = {1: OpenType.Isolated, 2: OpenType.Cross}
+_ORDER_TYPE_MAP: Dict[str, OrderType] = {"MARKET": OrderType.MarketOrder, "LIMIT": OrderType.PriceLimited}
+_LEQ_SIDES: FrozenSet[OrderSide] = frozenset({OrderSide.OpenLong, OrderSide.CloseShort})
+_TRIGGER_TYPE_LOOKUP: Dict[bool, TriggerType] = {
+    True: TriggerType.LessThanOrEqual,
+    False: TriggerType.GreaterThanOrEqual,
+}
+
+
+def _order_side(position_side: str, side: str) -> Optional[OrderSide]:
+    """
+    Вызывающие передают UPPERCASE; .upper() только если прямой ключ не найден.
+    """
+    order_side = _SIDE_MAP.get((position_side, side))
+    if order_side is None and position_side and side:
+        order_side = _SIDE_MAP.get((position_side.upper(), side.upper()))
+    return order_side
+
+
+@dataclass
+class ValidationResult:
+    """
+    Результат OrderValidator.validate_and_log.
+    • __slots__ вместо dict на каждый ответ
+    • .get() оставлен для старых вызовов res.get("success")
+    """
+    __slots__ = ("success", "order_id", "order_ids", "ts", "code", "reason", "raw", "raw_data")
+
+    success: bool
+    order_id: Optional[str]
+    order_ids: Optional[List[str]]
+    ts: int
+    code: Optional[int]
+    reason: Optional[str]
+    raw: Any
+    raw_data: Any
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+
 class OrderValidator:
     @staticmethod
     def validate_and_log(
-        result: ApiResponse,
+        result: Optional[ApiResponse],
         debug_label: str,
         debug: bool = True,
-    ) -> dict:
+    ) -> ValidationResult:
         """
         Универсальный валидатор ответа MEXC.
 
-        Возвращает:
+        Возвращает ValidationResult:
         {
             success: bool
             order_id: str | None
@@ -46,33 +101,35 @@ class OrderValidator:
         }
         """
 
-        ts = int(time.time() * 1000)
+        ts: int = time_ns() // 1_000_000
 
         if result is None:
-            return {
-                "success": False,
-                "order_id": None,
-                "order_ids": None,
-                "ts": ts,
-                "code": None,
-                "reason": "Empty response from exchange",
-                "raw": None,
-                "raw_data": None,
-            }
+            return ValidationResult(
+                False, None, None, ts, None, "Empty response from exchange", None, None,
+            )
 
-        raw_data = result.data
-        code = getattr(result, "code", None)
-        message = getattr(result, "message", None)
+        if not isinstance(result, ApiResponse):
+            return ValidationResult(
+                False, None, None, ts, None, "Bad response type", None, result,
+            )
+
+        raw_data: Any = result.data
+        code: Optional[int] = result.code
+        message: Optional[str] = result.message
 
         # ----------------------------
         # SUCCESS CASE
         # ----------------------------
         if result.success and code == 0:
-            order_id = None
-            order_ids = None
+            order_id: Optional[str] = None
+            order_ids: Optional[List[str]] = None
 
-            # create_order / trigger_order
-            if hasattr(raw_data, "orderId"):
+            # create_order → OrderId (частый случай — без hasattr)
+            if type(raw_data) is OrderId:
+                order_id = raw_data.orderId
+
+            # trigger_order / прочие объекты с orderId
+            elif hasattr(raw_data, "orderId"):
                 order_id = raw_data.orderId
 
             # cancel_orders (list)
@@ -90,36 +147,97 @@ class OrderValidator:
             if debug:
                 pass  # лог уже обернут через logger.wrap_foreign_methods
 
-            return {
-                "success": True,
-                "order_id": order_id,
-                "order_ids": order_ids,
-                "ts": ts,
-                "code": code,
-                "reason": None,
-                "raw": result,
-                "raw_data": raw_data,
-            }
+            return ValidationResult(
+                True, order_id, order_ids, ts, code, None, result, raw_data,
+            )
 
         # ----------------------------
         # ERROR CASE
         # ----------------------------
-        reason = message or "Unknown exchange error"
+        return ValidationResult(
+            False, None, None, ts, code, message or "Unknown exchange error", result, raw_data,
+        )
 
-        return {
-            "success": False,
-            "order_id": None,
-            "order_ids": None,
-            "ts": ts,
-            "code": code,
-            "reason": reason,
-            "raw": result,
-            "raw_data": raw_data,
-        }
+
+class PnlHistoryIndex:
+    """
+    Индекс истории позиций для оконных запросов PnL.
+
+    • строки парсятся ОДИН раз при построении
+    • раскладка по (symbol, direction), сортировка по updateTime
+    • префиксные суммы realised / profitRatio*100
+    • окно [start, end] → два bisect + разность префиксов
+    """
+
+    __slots__ = ("buckets",)
+
+    def __init__(self, rows: List[dict]):
+        grouped: Dict[Tuple[str, int], List[Tuple[int, float, float]]] = {}
+        grouped_get = grouped.get
+
+        for row in rows:
+            try:
+                symbol = row.get("symbol")
+                direction = row.get("positionType")  # 1 LONG / 2 SHORT
+                if not symbol or not direction:
+                    continue
+
+                ts = int(row.get("updateTime", 0))
+                realised = float(row.get("realised", 0.0))
+
+                pr = row.get("profitRatio")
+                pct = float(pr) * 100 if pr is not None else 0.0
+
+            except Exception:
+                continue
+
+            key = (symbol, direction)
+            bucket = grouped_get(key)
+            if bucket is None:
+                bucket = grouped[key] = []
+            bucket.append((ts, realised, pct))
+
+        self.buckets: Dict[Tuple[str, int], Tuple[Sequence[int], List[float], List[float]]] = {}
+
+        for key, items in grouped.items():
+            items.sort(key=itemgetter(0))
+
+            # строки → колонки, префиксы считает accumulate (C-уровень)
+            ts_arr, realised_col, pct_col = zip(*items)
+            cum_usdt = [0.0, *accumulate(realised_col)]
+            cum_pct = [0.0, *accumulate(pct_col)]
+
+            self.buckets[key] = (ts_arr, cum_usdt, cum_pct)
+
+    def window(
+        self,
+        key: Tuple[str, int],
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> Optional[Tuple[float, float]]:
+        """
+        (pnl_usdt, pnl_pct) за окно или None, если строк в окне нет.
+        """
+        bucket = self.buckets.get(key)
+        if not bucket:
+            return None
+
+        ts_arr, cum_usdt, cum_pct = bucket
+        lo = bisect_left(ts_arr, start_time) if start_time else 0
+        hi = bisect_right(ts_arr, end_time) if end_time else len(ts_arr)
+
+        if hi <= lo:
+            return None
+
+        return cum_usdt[hi] - cum_usdt[lo], cum_pct[hi] - cum_pct[lo]
 
 
 # ----------------------------
 class MexcClient:
+    # кеш индексов истории (ключ: symbol | None для batch)
+    PNL_INDEX_TTL_MS = 1000
+    PNL_INDEX_MAX = 8
+
     def __init__(
             self,
             connector: "NetworkManager",
@@ -129,7 +247,7 @@ class MexcClient:
             token: str = None,
             
         ):      
-        self.session: Optional[aiohttp.ClientSession] = connector.session
+        self.connector = connector
         self.logger = logger
 
         self.api_key = api_key
@@ -138,6 +256,72 @@ class MexcClient:
         self.api = MexcFuturesAPI(token, testnet=False)
         # self._is_wrapped = False
 
+        # (symbol, leverage, openType, type) → сериализованный шаблон тела ордера
+        self._order_tpl_cache: Dict[Tuple[str, int, OpenType, OrderType], Dict[str, Any]] = {}
+
+        # ключ: (symbol, direction); (None, None) — batch по всем символам
+        self._pnl_index_cache: "OrderedDict[Tuple[Optional[str], Optional[int]], Tuple[int, PnlHistoryIndex]]" = OrderedDict()
+
+    @property
+    def session(self) -> Optional[aiohttp.ClientSession]:
+        """
+        Всегда актуальная сессия NetworkManager
+        (после notify_session_failure сессия пересоздаётся).
+        """
+        return self.connector.session
+
+    # ----------------------------
+    def _cached_pnl_index(self, key: Tuple[Optional[str], Optional[int]]) -> Optional[PnlHistoryIndex]:
+        hit = self._pnl_index_cache.get(key)
+        if not hit:
+            return None
+
+        fetched_ts, index = hit
+        if time_ns() // 1_000_000 - fetched_ts > self.PNL_INDEX_TTL_MS:
+            self._pnl_index_cache.pop(key, None)
+            return None
+
+        self._pnl_index_cache.move_to_end(key)
+        return index
+
+    def _store_pnl_index(self, key: Tuple[Optional[str], Optional[int]], rows: List[dict]) -> PnlHistoryIndex:
+        index = PnlHistoryIndex(rows)
+
+        self._pnl_index_cache[key] = (time_ns() // 1_000_000, index)
+        self._pnl_index_cache.move_to_end(key)
+        while len(self._pnl_index_cache) > self.PNL_INDEX_MAX:
+            self._pnl_index_cache.popitem(last=False)
+
+        return index
+
+    def invalidate_pnl_index(self) -> None:
+        """Сброс кэша истории PnL: после закрытия позиции нужна свежая выборка, а не TTL-снимок."""
+        self._pnl_index_cache.clear()
+
+    def _order_template(
+        self,
+        symbol: str,
+        leverage: int,
+        openType: OpenType,
+        order_type: OrderType,
+    ) -> Dict[str, Any]:
+        key = (symbol, leverage, openType, order_type)
+        tpl = self._order_tpl_cache.get(key)
+        if tpl is None:
+            # тот же asdict, что делал create_order — формат тела не меняется
+            tpl = self._order_tpl_cache[key] = asdict(
+                CreateOrderRequest(
+                    symbol=symbol,
+                    side=OrderSide.OpenLong,
+                    vol=0,
+                    leverage=leverage,
+                    openType=openType,
+                    type=order_type,
+                ),
+                dict_factory=asdict_factory_with_enum_support,
+            )
+        return tpl
+
     # POST
     async def make_order(
         self,
@@ -155,31 +339,22 @@ class MexcClient:
     ) -> dict:
 
         # -------- market type
-        if market_type == "MARKET":
-            order_type = OrderType.MarketOrder
-        elif market_type == "LIMIT":
-            order_type = OrderType.PriceLimited
-        else:
+        order_type = _ORDER_TYPE_MAP.get(market_type)
+        if order_type is None:
             return OrderValidator.validate_and_log(
                 None, "MAKE_ORDER", debug
             )
 
         # -------- side
-        if position_side.upper() == "LONG":
-            order_side = OrderSide.OpenLong if side.upper() == "BUY" else OrderSide.CloseLong
-        elif position_side.upper() == "SHORT":
-            order_side = OrderSide.OpenShort if side.upper() == "BUY" else OrderSide.CloseShort
-        else:
+        order_side = _order_side(position_side, side)
+        if order_side is None:
             return OrderValidator.validate_and_log(
                 None, "MAKE_ORDER", debug
             )
 
         # -------- open type
-        if open_type == 1:
-            openType = OpenType.Isolated
-        elif open_type == 2:
-            openType = OpenType.Cross
-        else:
+        openType = _OPEN_TYPE_MAP.get(open_type)
+        if openType is None:
             return OrderValidator.validate_and_log(
                 None, "MAKE_ORDER", debug
             )
@@ -189,19 +364,17 @@ class MexcClient:
                 None, "MAKE_ORDER", debug
             )
 
+        # -------- body: константы из шаблона, патчим только переменные поля
+        body = dict(self._order_template(symbol, leverage, openType, order_type))
+        body["side"] = order_side.value
+        body["vol"] = contract
+        body["price"] = price
+        body["stopLossPrice"] = stopLossPrice
+        body["takeProfitPrice"] = takeProfitPrice
+
         # -------- API call
         result = await self.api.create_order(
-            order_request=CreateOrderRequest(
-                symbol=symbol,
-                side=order_side,
-                vol=contract,
-                leverage=leverage,
-                openType=openType,
-                type=order_type,
-                price=price,
-                stopLossPrice=stopLossPrice,
-                takeProfitPrice=takeProfitPrice,
-            ),
+            order_request=body,
             session=self.session,
         )
 
@@ -234,17 +407,8 @@ class MexcClient:
         # --------------------------------------------------
         # ORDER SIDE (open / close)
         # --------------------------------------------------
-        if position_side == "LONG":
-            order_side = (
-                OrderSide.OpenLong if side == "BUY"
-                else OrderSide.CloseLong
-            )
-        elif position_side == "SHORT":
-            order_side = (
-                OrderSide.OpenShort if side == "BUY"
-                else OrderSide.CloseShort
-            )
-        else:
+        order_side = _order_side(position_side, side)
+        if order_side is None:
             return OrderValidator.validate_and_log(
                 None, "TRIGGER_ORDER", debug
             )
@@ -252,21 +416,14 @@ class MexcClient:
         # --------------------------------------------------
         # TRIGGER TYPE (ключевая часть)
         # --------------------------------------------------
-        trigger_type = (
-            TriggerType.LessThanOrEqual
-            # if (side == "BUY" and position_side == "LONG") or (side == "SELL" and position_side == "SHORT")
-            if order_side in (OrderSide.OpenLong, OrderSide.CloseShort)
-            else TriggerType.GreaterThanOrEqual
-        )
+        # (BUY & LONG) | (SELL & SHORT) → LessThanOrEqual
+        trigger_type = _TRIGGER_TYPE_LOOKUP[order_side in _LEQ_SIDES]
 
         # --------------------------------------------------
         # OPEN TYPE
         # --------------------------------------------------
-        if open_type == 1:
-            openType = OpenType.Isolated
-        elif open_type == 2:
-            openType = OpenType.Cross
-        else:
+        openType = _OPEN_TYPE_MAP.get(open_type)
+        if openType is None:
             return OrderValidator.validate_and_log(
                 None, "TRIGGER_ORDER", debug
             )
@@ -350,13 +507,9 @@ class MexcClient:
         Отмена обычных (не trigger) лимитных ордеров по orderId.
         """
         if not order_id_list:
-            return {
-                "success": False,
-                "order_ids": [],
-                "reason": "order_id_list is empty",
-                "raw": None,
-                "ts": int(time.time() * 1000),
-            }
+            return ValidationResult(
+                False, None, [], time_ns() // 1_000_000, None, "order_id_list is empty", None, None,
+            )
 
         result = await self.api.cancel_orders(
             order_ids=order_id_list,
@@ -411,40 +564,39 @@ class MexcClient:
         }
 
         # --------------------------------------------------
-        # LIMIT ORDERS
+        # LIMIT + TRIGGER — независимые эндпоинты, параллельно
         # --------------------------------------------------
+        tasks = []
         if limit_order_ids:
-            try:
-                res = await self.cancel_limit_orders(
-                    order_id_list=limit_order_ids,
-                    debug=debug,
-                )
-                results["limit"] = res
+            tasks.append(("limit", self.cancel_limit_orders(
+                order_id_list=limit_order_ids,
+                debug=debug,
+            )))
+
+        symbol_missing = bool(trigger_order_ids) and not symbol
+        if trigger_order_ids and symbol:
+            tasks.append(("trigger", self.cancel_trigger_order(
+                order_id_list=trigger_order_ids,
+                symbol=symbol,
+                debug=debug,
+            )))
+
+        if tasks:
+            labels, coros = zip(*tasks)
+            gathered = await asyncio.gather(*coros, return_exceptions=True)
+
+            for label, res in zip(labels, gathered):
+                if isinstance(res, BaseException):
+                    results["errors"].append((label, str(res)))
+                    continue
+                results[label] = res
                 if not res.get("success"):
-                    results["errors"].append(("limit", res.get("reason")))
-            except Exception as e:
-                results["errors"].append(("limit", str(e)))
+                    results["errors"].append((label, res.get("reason")))
 
-        # --------------------------------------------------
-        # TRIGGER ORDERS
-        # --------------------------------------------------
-        if trigger_order_ids:
-            if not symbol:
-                results["errors"].append(
-                    ("trigger", "symbol is required for trigger order cancel")
-                )
-            else:
-                try:
-                    res = await self.cancel_trigger_order(
-                        order_id_list=trigger_order_ids,
-                        symbol=symbol,
-                        debug=debug,
-                    )
-                    results["trigger"] = res
-                    if not res.get("success"):
-                        results["errors"].append(("trigger", res.get("reason")))
-                except Exception as e:
-                    results["errors"].append(("trigger", str(e)))
+        if symbol_missing:
+            results["errors"].append(
+                ("trigger", "symbol is required for trigger order cancel")
+            )
 
         success = not results["errors"]
 
@@ -454,22 +606,10 @@ class MexcClient:
         }
 
     # # GET
-    async def get_realized_pnl_batch(
-        self,
-        *,
-        start_time: Optional[int] = None,
-        end_time: Optional[int] = None,
-    ) -> Dict[Tuple[str, int], dict]:
+    async def _batch_pnl_index(self) -> Optional[PnlHistoryIndex]:
         """
-        Batch PnL fetch.
-
-        Возвращает:
-        {
-            (symbol, direction): {
-                "pnl_usdt": float,
-                "pnl_pct": float
-            }
-        }
+        Индекс истории по ВСЕМ символам аккаунта (кэш (None, None)).
+        Один запрос + один ретрай; None — данных нет.
         """
 
         async def _fetch():
@@ -480,58 +620,89 @@ class MexcClient:
                 return resp.data
             return []
 
+        index = self._cached_pnl_index((None, None))
+        if index is not None:
+            return index
+
         try:
             rows = await _fetch()
         except Exception:
             try:
                 rows = await _fetch()
             except Exception:
-                return {}
+                return None
 
         if not rows:
+            return None
+
+        return self._store_pnl_index((None, None), rows)
+
+    async def get_realized_pnl_multi(
+        self,
+        queries: List[Tuple[str, int, Optional[int], Optional[int]]],
+    ) -> Dict[Tuple[str, int], dict]:
+        """
+        PnL для набора (symbol, direction, start_time, end_time) за ОДИН запрос истории.
+
+        • у каждого запроса своё окно (в отличие от batch с общим [min_start, end])
+        • ключ ответа: (symbol, direction); пустые окна в ответ не попадают
+        """
+        if not queries:
             return {}
 
-        acc: Dict[Tuple[str, int], dict] = {}
+        index = await self._batch_pnl_index()
+        if index is None:
+            return {}
 
-        for row in rows:
-            try:
-                ts = int(row.get("updateTime", 0))
-                if start_time and ts < start_time:
-                    continue
-                if end_time and ts > end_time:
-                    continue
+        out: Dict[Tuple[str, int], dict] = {}
 
-                symbol = row.get("symbol")
-                direction = row.get("positionType")  # 1 LONG / 2 SHORT
-                if not symbol or not direction:
-                    continue
+        for symbol, direction, start_time, end_time in queries:
+            key = (symbol, direction)
+            res = index.window(key, start_time, end_time)
+            if res is None:
+                continue
 
-                key = (symbol, direction)
-                rec = acc.setdefault(key, {
-                    "pnl_usdt": 0.0,
-                    "pnl_pct": 0.0,
-                    "matched": False,
-                })
+            pnl_usdt, pnl_pct = res
+            out[key] = {
+                "pnl_usdt": round(pnl_usdt, 6),
+                "pnl_pct": round(pnl_pct, 4),
+            }
 
-                rec["pnl_usdt"] += float(row.get("realised", 0.0))
+        return out
 
-                pr = row.get("profitRatio")
-                if pr is not None:
-                    rec["pnl_pct"] += float(pr) * 100
+    async def get_realized_pnl_batch(
+        self,
+        *,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> Dict[Tuple[str, int], dict]:
+        """
+        Batch PnL fetch.
 
-                rec["matched"] = True
+        Возвращает:
+        {
+            (symbol, direction): {
+                "pnl_usdt": float,
+                "pnl_pct": float
+            }
+        }
+        """
 
-            except Exception:
-                continue
+        index = await self._batch_pnl_index()
+        if index is None:
+            return {}
 
-        # normalize
-        out = {}
-        for k, v in acc.items():
-            if not v["matched"]:
+        out: Dict[Tuple[str, int], dict] = {}
+
+        for key in index.buckets:
+            res = index.window(key, start_time, end_time)
+            if res is None:
                 continue
-            out[k] = {
-                "pnl_usdt": round(v["pnl_usdt"], 6),
-                "pnl_pct": round(v["pnl_pct"], 4),
+
+            pnl_usdt, pnl_pct = res
+            out[key] = {
+                "pnl_usdt": round(pnl_usdt, 6),
+                "pnl_pct": round(pnl_pct, 4),
             }
 
         return out
@@ -558,59 +729,57 @@ class MexcClient:
         async def _fetch():
             resp = await self.api.get_historical_orders_report(
                 symbol=symbol,
+                position_type=direction or None,
                 session=self.session
             )
             if resp and getattr(resp, "success", False) and resp.data:
                 return resp.data
             return []
 
+        cache_key = (symbol, direction or None)
+        index = self._cached_pnl_index(cache_key)
+
         # ---------- FETCH WITH ONE RETRY ----------
-        try:
-            rows = await _fetch()
-        except Exception as e:
-            self.logger.exception(
-                f"[get_realized_pnl] fetch error, retrying once: {e}",
-                is_print=True,
-            )
+        if index is None:
             try:
                 rows = await _fetch()
-            except Exception as e2:
+            except Exception as e:
                 self.logger.exception(
-                    f"[get_realized_pnl] retry failed: {e2}",
+                    f"[get_realized_pnl] fetch error, retrying once: {e}",
                     is_print=True,
                 )
+                try:
+                    rows = await _fetch()
+                except Exception as e2:
+                    self.logger.exception(
+                        f"[get_realized_pnl] retry failed: {e2}",
+                        is_print=True,
+                    )
+                    return {"pnl_usdt": None, "pnl_pct": None}
+
+            if not rows:
                 return {"pnl_usdt": None, "pnl_pct": None}
 
-        if not rows:
-            return {"pnl_usdt": None, "pnl_pct": None}
+            index = self._store_pnl_index(cache_key, rows)
 
         # ---------- CALC ----------
         pnl_usdt = 0.0
         pnl_pct = 0.0
         matched = False
 
-        for row in rows:
-            try:
-                ts = int(row.get("updateTime", 0))
-
-                if start_time and ts < start_time:
-                    continue
-                if end_time and ts > end_time:
-                    continue
-                if direction and row.get("positionType") != direction:
-                    continue
-
-                pnl_usdt += float(row.get("realised", 0.0))
-
-                pr = row.get("profitRatio")
-                if pr is not None:
-                    pnl_pct += float(pr) * 100
-
-                matched = True
+        for key in index.buckets:
+            # постоянный guard: биржа может вернуть обе стороны, игнорируя position_type
+            if direction and key[1] != direction:
+                continue
 
-            except Exception:
+            res = index.window(key, start_time, end_time)
+            if res is None:
                 continue
 
+            pnl_usdt += res[0]
+            pnl_pct += res[1]
+            matched = True
+
         if not matched:
             return {"pnl_usdt": None, "pnl_pct": None}
 
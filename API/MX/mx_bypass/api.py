@@ -437,10 +437,17 @@ class MexcFuturesAPI:
         )
 
     # Order management
-    async def create_order(self, order_request: CreateOrderRequest, session = None) -> ApiResponse[OrderId]:
+    async def create_order(
+        self, order_request: Union[CreateOrderRequest, Dict[str, Any]], session = None
+    ) -> ApiResponse[OrderId]:
+        # dict → уже сериализованное тело (enum → value), asdict не нужен
+        body = (
+            order_request if isinstance(order_request, dict)
+            else asdict(order_request, dict_factory=asdict_factory_with_enum_support)
+        )
         return await self._make_request(
             session, "POST", "/private/order/create",
-            asdict(order_request, dict_factory=asdict_factory_with_enum_support), response_type=OrderId
+            body, response_type=OrderId
         )
 
     async def cancel_orders(self, order_ids: List[str], session = None) -> ApiResponse[List[Dict[str, Any]]]:
@@ -582,6 +589,7 @@ class MexcFuturesAPI:
         page_num: int = 1,
         page_size: int = 20,
         session: Optional[aiohttp.ClientSession] = None,
+        position_type: Optional[int] = None,
     ) -> ApiResponse[List[Dict[str, Any]]]:
         """
         Получить фьючерсный отчет (History Positions) с MEXC.
@@ -593,9 +601,11 @@ class MexcFuturesAPI:
             symbol (str): символ контракта
             page_num (int): номер страницы
             page_size (int): размер страницы
+            position_type (int): 1=LONG, 2=SHORT — фильтр на стороне биржи (None → все)
         """
         params = {
             "symbol": symbol,
+            "type": position_type,
             "page_num": page_num,
             "page_size": page_size,
         }
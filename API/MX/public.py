@@ -4,6 +4,13 @@ from __future__ import annotations
 import aiohttp
 from typing import Optional, Dict, List
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson опционален
+    import json
+    _loads = json.loads
+
 
 class MXPublic:
     # BASE_URL = "https://futures.testnet.mexc.com/api/v1"
@@ -23,7 +30,8 @@ class MXPublic:
             async with session.get(url, params=params, proxy=proxy_url, timeout=10) as resp:
                 if resp.status != 200:
                     return None
-                return await resp.json()
+                raw = await resp.read()
+                return _loads(raw) if raw else None
         except Exception:
             return None
 
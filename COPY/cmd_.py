@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import copy
 from typing import *
 
 from c_utils import now
@@ -12,6 +13,19 @@ if TYPE_CHECKING:
     from c_log import UnifiedLogger
 
 
+# шаблон synthetic manual close: всё константно, кроме ts
+_MANUAL_CLOSE_TEMPLATE = MasterEvent(
+    event="sell",
+    method="market",
+    symbol="ALL OPENED SYMBOLS",
+    pos_side=None,
+    closed=True,
+    payload=None,
+    sig_type="manual",
+    ts=0,
+)
+
+
 class CmdDestrib:
     """
     Manual CLOSE orchestrator.
@@ -49,20 +63,13 @@ class CmdDestrib:
             return
 
         # ---- UI INTENT LOG ----
-        self.mc.log_events.append(
-            (0, f"🔴 CLOSE INTENT: manual button → copies [{', '.join(map(str, ids))}]")
-        )
+        _append = self.mc.log_events.append
+        ids_str = ", ".join(map(str, ids))
+        _append((0, f"🔴 CLOSE INTENT: manual button → copies [{ids_str}]"))
+
         self.mc.cmd_ids = ids
-        mev = MasterEvent(
-            event="sell",
-            method="market",
-            symbol="ALL OPENED SYMBOLS",
-            pos_side=None,
-            closed=True,
-            payload=None,
-            sig_type="manual",
-            ts=now(),
-        )
+        mev = copy.copy(_MANUAL_CLOSE_TEMPLATE)
+        mev.ts = now()
         payload = self.mc.master_payload
         if not payload:
             self.logger.warning("Manual close ignored: payload not ready")
@@ -6,7 +6,7 @@ import asyncio
 # import time
 from typing import *
 
-from a_config import TG_LOG_TTL_MS, IS_REPORT
+from a_config import TG_LOG_TTL_MS, TG_LOG_FLUSH_BYTES, IS_REPORT
 from c_log import UnifiedLogger
 from c_utils import now
 
@@ -26,13 +26,44 @@ if TYPE_CHECKING:
 # ==================================================
 # SNAPSHOT HASH (ACCOUNT-LEVEL)
 # ==================================================
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_SIDE_SALT: Dict[str, int] = {
+    "LONG": 0x9E3779B97F4A7C15,
+    "SHORT": 0xC2B2AE3D27D4EB4F,
+}
+_symbol_hash: Dict[str, int] = {}
+
+# ключи payload manual close в порядке прежнего литерала; константа — только reduce_only
+_MANUAL_CLOSE_PAYLOAD: Dict[str, Any] = {
+    "qty": None,
+    "reduce_only": True,
+    "leverage": None,
+    "open_type": None,
+}
+
+
 def snapshot_hash(position_vars: Dict[str, Dict[str, dict]]) -> int:
-    h = 0
+    """
+    Порядконезависимый 64-bit fingerprint открытых позиций.
+    Сумма (а не XOR) — одинаковые записи не гасят друг друга.
+    """
+    h: int = 0
+    sym_h: Optional[int]
+    k: int
     for symbol, sides in position_vars.items():
+        sym_h = None
         for side, pv in sides.items():
-            qty = pv.get("qty", 0)
-            if qty:
-                h ^= hash((symbol, side, qty))
+            qty: float = pv.get("qty", 0)
+            if not qty:
+                continue
+
+            if sym_h is None:
+                sym_h = _symbol_hash.get(symbol)
+                if sym_h is None:
+                    sym_h = _symbol_hash[symbol] = (hash(symbol) * 1315423911) & _MASK64
+
+            k = sym_h ^ _SIDE_SALT.get(side, 0) ^ int(qty * 1e8)
+            h = (h + k) & _MASK64
     return h
 
 # ==================================================
@@ -48,14 +79,34 @@ async def safe_refresh(m: PosMonitorFSM, timeout: float = 2.0) -> bool:
 # ==================================================
 # REFRESH COORDINATOR (BACKGROUND, HASH-BASED)
 # ==================================================
+class _WatchSlot:
+    """Всё состояние pending-cid в одном объекте: watcher держит ссылку, без dict.get на тик."""
+    __slots__ = ("monitor", "deadline", "wakeup", "task")
+
+    def __init__(self, monitor: PosMonitorFSM, deadline: int):
+        self.monitor = monitor
+        self.deadline = deadline
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
 class RefreshCoordinator:
     """
     Background refresh with hash-based convergence per cid.
+
+    • свой watcher-таск на каждый cid — сходится сразу после своего refresh,
+      не дожидаясь общего тика
+    • trigger() во время прогона подменяет монитор в слоте и будит watcher
+    • одновременные fetch_positions ограничены семафором
     """
 
+    MAX_INFLIGHT = 16
+    TTL_MS = 5000
+
     def __init__(self):
-        self._task: Optional[asyncio.Task] = None
         self._prev_hash: Dict[int, int] = {}
+        self._slots: Dict[int, _WatchSlot] = {}
+        self._sem = asyncio.Semaphore(self.MAX_INFLIGHT)
         self.on_stable: Optional[Callable] = None
 
     def snapshot(self, cid: int, rt: dict):
@@ -66,44 +117,57 @@ class RefreshCoordinator:
         if not monitors:
             return
 
-        if not self._task or self._task.done():
-            self._task = asyncio.create_task(self._run(monitors))
-
-    async def _run(self, monitors: Dict[int, PosMonitorFSM], ttl_ms: int = 5000):
-        start_ts = now()
-        delay = 0.05
+        deadline = now() + self.TTL_MS
+        slots = self._slots
+        for cid, m in monitors.items():
+            slot = slots.get(cid)
+            if slot is not None and slot.task and not slot.task.done():
+                slot.monitor = m
+                slot.deadline = deadline
+                slot.wakeup.set()
+                continue
 
-        pending: Set[int] = set(monitors.keys())
+            slot = slots[cid] = _WatchSlot(m, deadline)
+            slot.task = asyncio.create_task(self._watch(cid, slot))
 
-        while pending and now() - start_ts < ttl_ms:
-            await asyncio.gather(
-                *[safe_refresh(monitors[cid]) for cid in list(pending)],
-                return_exceptions=True,
-            )
+    async def _refresh(self, m: PosMonitorFSM) -> bool:
+        async with self._sem:
+            return await safe_refresh(m)
 
-            on_stable_ids = []
+    async def _watch(self, cid: int, slot: _WatchSlot):
+        delay = 0.05
+        wakeup = slot.wakeup
+        prev_hash = self._prev_hash
 
-            for cid in list(pending):
-                m = monitors.get(cid)
-                if not m:
-                    pending.discard(cid)
-                    continue
+        try:
+            while True:
+                wakeup.clear()
+                m = slot.monitor
+                await self._refresh(m)
 
                 cur = snapshot_hash(m.position_vars)
-                prev = self._prev_hash.get(cid)
+                prev = prev_hash.get(cid)
 
                 if prev is not None and cur != prev:
-                    pending.discard(cid)
-                    self._prev_hash[cid] = cur   # ← зафиксировали новое состояние
-                    on_stable_ids.append(cid)
+                    prev_hash[cid] = cur   # ← зафиксировали новое состояние
+
+                    # refresh завершён для cid → можно считать PnL
+                    if IS_REPORT and self.on_stable:
+                        asyncio.create_task(self.on_stable([cid]))
+                    return
 
-            # refresh завершён для on_stable_ids → можно считать PnL
-            if IS_REPORT:
-                if self.on_stable and on_stable_ids:
-                    asyncio.create_task(self.on_stable(on_stable_ids))
+                if now() >= slot.deadline:
+                    return
 
-            await asyncio.sleep(delay)
-            delay = min(delay * 1.25, 0.5)
+                # повторный trigger будит watcher сразу, иначе — backoff
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=delay)
+                    delay = 0.05
+                except asyncio.TimeoutError:
+                    delay = min(delay * 1.25, 0.5)
+        finally:
+            if self._slots.get(cid) is slot:
+                del self._slots[cid]
 
 
 # ==================================================
@@ -114,6 +178,10 @@ class CopyDestrib:
     CopyDestrib — неблокирующий intake + сериализованный executor.
     """
 
+    NOTIFY_QUEUE_MAX = 1024
+    MAX_INFLIGHT_SIGNALS = 64
+    DRAIN_TIMEOUT_SEC = 3.0   # teardown: общий бюджет на исполнения + хвост уведомлений (< STOP_TASK_TIMEOUT_SEC supervisor'а)
+
     def __init__(
         self,
         mc: "MainContext",
@@ -132,6 +200,16 @@ class CopyDestrib:
         self._stop_tracker = True
         self._last_log_flush_ts: int = 0
         self._pnl_results: List = []
+        self._pending_texts: List[str] = []
+        self._pending_bytes: int = 0
+        self._exec_sem = asyncio.Semaphore(self.MAX_INFLIGHT_SIGNALS)
+        self._inflight: Set[asyncio.Task] = set()   # свои исполнения (background_tasks общий)
+        self._monitors_pool: List[Dict[int, PosMonitorFSM]] = []   # free-list scratch-dict'ов
+        self._on_spawn_done = self._spawn_done   # один bound-callback на все таски
+        self._enabled_ver: int = -1
+        self._enabled_cache: List[Tuple[int, dict]] = []
+        self._notify_queue: asyncio.Queue = asyncio.Queue(maxsize=self.NOTIFY_QUEUE_MAX)
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
 
         self.intent_factory = CopyOrderIntentFactory(self.mc)
         self.reset_pv_state = PreparePnlReport(self.mc, self.logger)
@@ -164,32 +242,97 @@ class CopyDestrib:
     # ==================================================
     # UI LOG FLUSH WITH TTL
     # ==================================================
-    async def _flush_notify_with_ttl(self) -> None:
-        if not self.mc.log_events:
+    def _flush_notify_with_ttl(self) -> None:
+        """
+        • log_events форматируются сразу и копятся в _pending_texts
+        • flush сразу: первый flush ИЛИ накоплено >= TG_LOG_FLUSH_BYTES
+        • иначе один таймер на TG_LOG_TTL_MS — без now() на каждый сигнал
+        • логи + PnL-отчёт уходят одним блоком в _notify_queue (без await)
+        """
+        self._take_log_events()
+
+        if not self._pending_texts and not (IS_REPORT and self._pnl_results):
             return
 
-        now_ts = now()
-        if (
-            self._last_log_flush_ts == 0
-            or now_ts - self._last_log_flush_ts >= TG_LOG_TTL_MS
-        ):
-            texts = FormatUILogs.flush_log_events(self.mc.log_events)
-            if texts or self._pnl_results:
-                self._last_log_flush_ts = now_ts
+        if self._last_log_flush_ts == 0 or self._pending_bytes >= TG_LOG_FLUSH_BYTES:
+            self._flush_now()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                TG_LOG_TTL_MS / 1000, self._flush_on_timer
+            )
+
+    def _take_log_events(self) -> None:
+        if self.mc.log_events:
+            new_texts = FormatUILogs.flush_log_events(self.mc.log_events)
+            if new_texts:
+                self._pending_texts.extend(new_texts)
+                self._pending_bytes += sum(map(len, new_texts))
+
+    def _flush_on_timer(self) -> None:
+        self._flush_handle = None
+        self._take_log_events()
+        self._flush_now()
+
+    def _flush_now(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        texts = self._pending_texts
+        self._pending_texts = []
+        self._pending_bytes = 0
+        self._last_log_flush_ts = now()
+
+        if IS_REPORT and self._pnl_results:
+            texts.extend(FormatUILogs.format_general_report(self._pnl_results))
+            texts.append(FormatUILogs.format_general_summary(self._pnl_results))
+            self._pnl_results.clear()
+
+        if not texts:
+            return
 
-            if texts:
-                await self.mc.tg_notifier.send_block(texts)
+        q = self._notify_queue
+        if q.full():
+            try:
+                q.get_nowait()   # drop-oldest
+                q.task_done()
+            except asyncio.QueueEmpty:
+                pass
+        q.put_nowait(texts)
 
-            if IS_REPORT and self._pnl_results:
-                texts = []
-                texts.extend(FormatUILogs.format_general_report(self._pnl_results))
-                texts.append(FormatUILogs.format_general_summary(self._pnl_results))                
+    async def _notifier_worker(self) -> None:
+        """
+        Единственный потребитель _notify_queue: TG I/O вне execute-пути.
+        """
+        q = self._notify_queue
+        while True:
+            texts = await q.get()
+            try:
                 await self.mc.tg_notifier.send_block(texts)
-                self._pnl_results.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception("[CopyDestrib] notify send failed")
+            finally:
+                q.task_done()
 
     # ==================================================
     # INTERNAL: FAN-OUT
     # ==================================================
+    def _enabled_copies(self) -> List[Tuple[int, dict]]:
+        """
+        Снимок enabled-копий; пересобирается только при смене mc.copy_configs_version.
+        """
+        ver = self.mc.copy_configs_version
+        if ver != self._enabled_ver:
+            self._enabled_cache = [
+                (cid, cfg)
+                for cid, cfg in self.mc.copy_configs.items()
+                if cid and cfg and cfg.get("enabled")
+            ]
+            self._enabled_ver = ver
+        return self._enabled_cache
+
     async def _broadcast_to_copies(
         self,
         mev: MasterEvent,
@@ -200,32 +343,31 @@ class CopyDestrib:
 
         self.mc.log_events.append((0, mev))
 
-        tasks: list[asyncio.Task] = []
-
-        for cid, cfg in self.mc.copy_configs.items():
-            if cid == 0 or not cfg or not cfg.get("enabled"):
-                continue
+        coros: List[Awaitable] = []
 
+        for cid, cfg in self._enabled_copies():
             rt = self.copy_state.ensure_copy_state(cid)
             if not rt:
                 continue
 
             self._refresh.snapshot(cid=cid, rt=rt)
 
-            tasks.append(
-                asyncio.create_task(
-                    self._exequter.handle_copy_event(cid, cfg, rt, mev, monitors)
-                )
+            coros.append(
+                self._exequter.handle_copy_event(cid, cfg, rt, mev, monitors)
             )
 
-        if tasks:
-            await asyncio.gather(*tasks)
+        # одна копия — без gather/Task; иначе gather сам оборачивает корутины
+        if len(coros) == 1:
+            await coros[0]
+        elif coros:
+            await asyncio.gather(*coros)
 
     # ==================================================
     # EXECUTOR
     # ==================================================
     async def _execute_signal(self, mev: MasterEvent):
-        local_monitors: Dict[int, PosMonitorFSM] = {}
+        pool = self._monitors_pool
+        local_monitors: Dict[int, PosMonitorFSM] = pool.pop() if pool else {}
 
         try:
             if mev.sig_type == "manual":
@@ -251,11 +393,17 @@ class CopyDestrib:
             if local_monitors:
                 self._refresh.trigger(local_monitors)
 
+            # trigger() копирует мониторы к себе → dict можно вернуть в пул.
+            # При исключении НЕ возвращаем: недобежавшие ветки gather ещё могут в него писать
+            local_monitors.clear()
+            if len(pool) < self.MAX_INFLIGHT_SIGNALS:
+                pool.append(local_monitors)
+
         except Exception:
             self.logger.exception("[CopyDestrib] execute_signal failed")
 
         finally:
-            await self._flush_notify_with_ttl()
+            self._flush_notify_with_ttl()
 
     async def _execute_and_ack(self, mev: MasterEvent):
         try:
@@ -275,45 +423,99 @@ class CopyDestrib:
         Expands manual CLOSE intent into atomic close events.
         """
         events: List[MasterEvent] = []
+        append = events.append
+        ensure = self.copy_state.ensure_copy_state
+        ME = MasterEvent
+        tpl_copy = _MANUAL_CLOSE_PAYLOAD.copy
+        ts = mev.ts
 
         for cid in self.mc.cmd_ids:
-            rt = self.copy_state.ensure_copy_state(cid)
+            rt = ensure(cid)
             if not rt:
                 continue
 
             position_vars = rt.get("position_vars") or {}
 
-            for symbol, sides in position_vars.items():
-                for pos_side, pv in sides.items():
-                    if not pv.get("in_position"):
-                        continue
-
-                    qty = pv.get("qty")
-                    if not qty or qty <= 0:
-                        continue
-
-                    sub = MasterEvent(
-                        event="sell",
-                        method="market",
-                        symbol=symbol,
-                        pos_side=pos_side,
-                        closed=True,
-                        sig_type="manual",
-                        payload={
-                            "qty": qty,
-                            "reduce_only": True,
-                            "leverage": pv.get("leverage"),
-                            "open_type": pv.get("margin_mode"),
-                        },
-                        ts=mev.ts,
-                    )
-
-                    # 🔒 жёсткая привязка к конкретному copy-id
-                    sub._cid = cid
-                    events.append(sub)
+            # только открытые (symbol, side) — индекс ведёт PosMonitorFSM.refresh
+            for symbol, pos_side in tuple(rt.get("open_positions") or ()):
+                pv = position_vars.get(symbol, {}).get(pos_side)
+                if not pv:
+                    continue
+
+                get = pv.get
+                qty = get("qty")
+                if not (get("in_position") and qty and qty > 0):
+                    continue
+
+                payload = tpl_copy()
+                payload["qty"] = qty
+                payload["leverage"] = get("leverage")
+                payload["open_type"] = get("margin_mode")
+
+                sub = ME(
+                    event="sell",
+                    method="market",
+                    symbol=symbol,
+                    pos_side=pos_side,
+                    closed=True,
+                    sig_type="manual",
+                    payload=payload,
+                    ts=ts,
+                )
+
+                # 🔒 жёсткая привязка к конкретному copy-id
+                sub._cid = cid
+                append(sub)
 
         return events
 
+    # ==================================================
+    # BOUNDED SPAWN
+    # ==================================================
+    async def _spawn(self, coro: Awaitable) -> None:
+        """
+        Не более MAX_INFLIGHT_SIGNALS исполнений одновременно:
+        при заполнении signal_loop ждёт слот (backpressure на out_queue).
+        """
+        try:
+            await self._exec_sem.acquire()
+        except BaseException:
+            coro.close()
+            raise
+
+        task = asyncio.create_task(coro)
+        self.mc.background_tasks.add(task)
+        self._inflight.add(task)
+        task.add_done_callback(self._on_spawn_done)
+
+    def _spawn_done(self, task: asyncio.Task) -> None:
+        self.mc.background_tasks.discard(task)
+        self._inflight.discard(task)
+        self._exec_sem.release()
+
+    async def _drain_notify(self, notifier: asyncio.Task) -> None:
+        """
+        Teardown: дожидается запущенных исполнений, сбрасывает буфер
+        и даёт воркеру отправить очередь, затем гасит СВОЙ воркер.
+        Всё укладывается в один DRAIN_TIMEOUT_SEC.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.DRAIN_TIMEOUT_SEC
+        try:
+            if self._inflight:
+                await asyncio.wait(set(self._inflight), timeout=self.DRAIN_TIMEOUT_SEC)
+
+            # последний буфер логов / PnL не теряем: _flush_now сам снимает таймер
+            self._take_log_events()
+            self._flush_now()
+
+            if not notifier.done():
+                await asyncio.wait_for(self._notify_queue.join(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.logger.warning("[CopyDestrib] notify drain timeout")
+        finally:
+            notifier.cancel()
+
     # ==================================================
     # SIGNAL LOOP
     # ==================================================
@@ -326,9 +528,11 @@ class CopyDestrib:
         self._stop_signal_loop = False
         self._stop_tracker = False
 
+        # мастер-конфиг перечитываем на каждом тике: _init_accounts / load могут пересобрать copy_configs[0]
         while not self.stop_flag() and not self._stop_signal_loop:
-            master_rt = self.mc.copy_configs.get(0, {}).get("cmd_state", {})
-            if master_rt.get("trading_enabled") and not master_rt.get("stop_flag"):
+            master_cfg = self.mc.copy_configs.get(0)
+            master_rt = master_cfg.get("cmd_state") if master_cfg else None
+            if master_rt and master_rt.get("trading_enabled") and not master_rt.get("stop_flag"):
                 break
             await asyncio.sleep(0.1)
 
@@ -337,6 +541,9 @@ class CopyDestrib:
 
         self.logger.info("CopyDestrib: READY")
 
+        # воркер принадлежит этому запуску: старый loop при дренаже не гасит воркер нового
+        notifier = asyncio.create_task(self._notifier_worker())
+
         while not self.stop_flag() and not self._stop_signal_loop:
             try:
                 mev: MasterEvent = await self.payload.out_queue.get()
@@ -347,18 +554,16 @@ class CopyDestrib:
                 if mev.sig_type == "manual":
                     expanded = await self._expand_manual_close(mev)
                     for sub_mev in expanded:
-                        task = asyncio.create_task(self._execute_signal(sub_mev))
-                        self.mc.background_tasks.add(task)
-                        task.add_done_callback(self.mc.background_tasks.discard)
+                        await self._spawn(self._execute_signal(sub_mev))
 
                     self.payload.out_queue.task_done()
                     self.mc.cmd_ids.clear()
                 else:
-                    task = asyncio.create_task(self._execute_and_ack(mev))
-                    self.mc.background_tasks.add(task)
-                    task.add_done_callback(self.mc.background_tasks.discard)
+                    await self._spawn(self._execute_and_ack(mev))
 
             except asyncio.CancelledError:
                 break
 
+        await self._drain_notify(notifier)
+
         self.logger.info("CopyDestrib: signal_loop FINISHED")
\ No newline at end of file
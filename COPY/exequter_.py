@@ -3,9 +3,11 @@
 from __future__ import annotations
 
 import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import *
 
-from b_context import PosVarTemplate
+from a_config import DEBUG_LATENCY
 from c_utils import now
 from .pv_fsm_ import PosMonitorFSM
 from .state_ import CopyOrderIntentFactory
@@ -20,51 +22,22 @@ if TYPE_CHECKING:
     from API.MX.client import MexcClient
 
 
-# ======================================================================
-# POSITION ACCESS
-# ======================================================================
-def get_cid_symbol_pos(rt: dict, symbol: str, side: str) -> dict:
-    pv_root = rt.setdefault("position_vars", {})
-    sym = pv_root.setdefault(symbol, {})
-    if side not in sym:
-        sym[side] = PosVarTemplate.base_template()
-    return sym[side]
-
-# ==================================================
-# LATENCY (DEBUG PRINT ONLY)
-# ==================================================
-def record_latency(
-    cid: int,
-    mev: "MasterEvent",
-    res: Optional[dict],
-) -> None:
-    """
-    Debug-only latency print.
-    No storage, no side effects.
-    """
-
-    if not res or not isinstance(res, dict):
-        return
-
-    master_ts = getattr(mev, "ts", None)
-    if not master_ts:
-        return
-
-    copy_ts = res.get("ts")
-    if not copy_ts:
-        return
-
-    latency = copy_ts - master_ts
-
-    print(
-        f"[LATENCY]"
-        f" cid={cid}"
-        f" {mev.symbol}"
-        f" {mev.pos_side}"
-        f" latency={latency}ms"
-        # f" master_ts={master_ts}"
-        # f" copy_ts={copy_ts}"
-    )  
+def _mark_closed_pending(index: Set[Tuple[int, str, str]], cid: int, symbol: str, pos_side: str) -> None:
+    index.add((cid, symbol, pos_side))
+
+
+def _copy_oids(bucket: Optional[Dict[str, dict]]) -> List[str]:
+    """copy_order_id всех записей bucket (limit / trigger), один .get на запись."""
+    if not bucket:
+        return []
+    return [oid for v in bucket.values() if (oid := v.get("copy_order_id"))]
+
+
+# mev.method → (ключ в side_root, метка лога, вызов отмены)
+_CANCEL_DISPATCH: Dict[str, Tuple[str, str, Callable[["MexcClient", List[str], str], Awaitable]]] = {
+    "limit": ("limit", "LIMIT", lambda c, oids, sym: c.cancel_limit_orders(oids)),
+    "trigger": ("trigger", "TRIGGER", lambda c, oids, sym: c.cancel_trigger_order(oids, symbol=sym)),
+}
 
 
 class CopyExequter:
@@ -78,6 +51,41 @@ class CopyExequter:
 
         self.payload: Optional["MasterPayload"] = None
         self.intent_factory = CopyOrderIntentFactory(self.mc)
+
+        # точные локи по (cid, symbol, side) вне state-dict: key → [lock, users]; удаляются, когда ключ простаивает
+        self._locks: Dict[Tuple[int, str, str], list] = {}
+
+        # symbol → (mc.pos_vars_version, spec)
+        self._spec_cache: Dict[str, Tuple[int, dict]] = {}
+
+    @asynccontextmanager
+    async def _key_lock(self, key: Tuple[int, str, str]):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._locks.pop(key, None)
+
+    def _get_spec(self, symbol: str) -> dict:
+        ver = self.mc.pos_vars_version
+        entry = self._spec_cache.get(symbol)
+        if entry is not None and entry[0] == ver:
+            return entry[1]
+
+        spec = (
+            self.mc.pos_vars_root
+            .get("position_vars", {})
+            .get(symbol, {})
+            .get("spec", {})
+        )
+        self._spec_cache[symbol] = (ver, spec)
+        return spec
      
     async def trigger_executor_(
         self,
@@ -106,12 +114,9 @@ class CopyExequter:
             debug=True,
         )
 
-        record_latency(
-            cid=cid,
-            mev=mev,
-            res=res
-        )
-        print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
+        if DEBUG_LATENCY:
+            record_latency(cid=cid, mev=mev, res=res)
+            print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
 
         if not res or not res.get("success"):
             rt["last_error"] = res.get("reason") if res else "UNKNOWN"
@@ -146,73 +151,34 @@ class CopyExequter:
             )
             return
 
-        # ---------- LIMIT ----------
-        if mev.method == "limit":
-            limit_root = side_root.get("limit", {})
-            rec = limit_root.pop(master_oid, None)
-            if not rec:
-                self.mc.log_events.append(
-                    (cid, f"{mev.symbol} {mev.pos_side} :: LIMIT CANCEL MISS master_oid={master_oid}")
-                )
-                return
-
-            copy_oid = rec.get("copy_order_id")
-            if not copy_oid:
-                return
+        entry = _CANCEL_DISPATCH.get(mev.method)
+        if entry is None:
+            return
 
-            res = await client.cancel_limit_orders([copy_oid])
+        root_key, label, cancel = entry
+        anchor = f"{mev.symbol} {mev.pos_side}"
+        append = self.mc.log_events.append
 
-            record_latency(
-                cid=cid,
-                mev=mev,
-                res=res
-            )
-            print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
-
-            if not res or not res.get("success"):
-                self.mc.log_events.append(
-                    (cid, f"{mev.symbol} {mev.pos_side} :: LIMIT CANCEL FAILED copy_oid={copy_oid}")
-                )
-            else:
-                self.mc.log_events.append(
-                    (cid, f"{mev.symbol} {mev.pos_side} :: LIMIT CANCELED copy_oid={copy_oid}")
-                )
+        rec = side_root.get(root_key, {}).pop(master_oid, None)
+        if not rec:
+            append((cid, f"{anchor} :: {label} CANCEL MISS master_oid={master_oid}"))
             return
 
-        # ---------- TRIGGER ----------
-        elif mev.method == "trigger":
-            trigger_root = side_root.get("trigger", {})
-            rec = trigger_root.pop(master_oid, None)
-            if not rec:
-                self.mc.log_events.append(
-                    (cid, f"{mev.symbol} {mev.pos_side} :: TRIGGER CANCEL MISS master_oid={master_oid}")
-                )
-                return
+        copy_oid = rec.get("copy_order_id")
+        if not copy_oid:
+            return
 
-            copy_oid = rec.get("copy_order_id")
-            if not copy_oid:
-                return
+        res = await cancel(client, [copy_oid], mev.symbol)
 
-            res = await client.cancel_trigger_order(
-                [copy_oid],
-                symbol=mev.symbol,
-            )
-            record_latency(
-                cid=cid,
-                mev=mev,
-                res=res
-            )
+        if DEBUG_LATENCY:
+            record_latency(cid=cid, mev=mev, res=res)
             print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
-            if not res or not res.get("success"):
-                self.mc.log_events.append(
-                    (cid, f"{mev.symbol} {mev.pos_side} :: TRIGGER CANCEL FAILED copy_oid={copy_oid}")
-                )
-            else:
-                self.mc.log_events.append(
-                    (cid, f"{mev.symbol} {mev.pos_side} :: TRIGGER CANCELED copy_oid={copy_oid}")
-                )
-            return
-    
+
+        if not res or not res.get("success"):
+            append((cid, f"{anchor} :: {label} CANCEL FAILED copy_oid={copy_oid}"))
+        else:
+            append((cid, f"{anchor} :: {label} CANCELED copy_oid={copy_oid}"))
+
     async def close_executor_(
         self,
         cid: int,
@@ -237,12 +203,9 @@ class CopyExequter:
             debug=True,
         )
 
-        record_latency(
-            cid=cid,
-            mev=mev,
-            res=res
-        )
-        print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
+        if DEBUG_LATENCY:
+            record_latency(cid=cid, mev=mev, res=res)
+            print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
 
         if not res or not res.get("success"):
             rt["last_error"] = res.get("reason") if res else "UNKNOWN"
@@ -253,16 +216,8 @@ class CopyExequter:
             return
         
         if mev.sig_type == "manual":
-            limit_ids = [
-                v.get("copy_order_id")
-                for v in side_root.get("limit", {}).values()
-                if v.get("copy_order_id")
-            ]
-            trigger_ids = [
-                v.get("copy_order_id")
-                for v in side_root.get("trigger", {}).values()
-                if v.get("copy_order_id")
-            ]
+            limit_ids = _copy_oids(side_root.get("limit"))
+            trigger_ids = _copy_oids(side_root.get("trigger"))
 
             if not (limit_ids or trigger_ids):
                 return
@@ -311,12 +266,9 @@ class CopyExequter:
             debug=True,
         )
 
-        record_latency(
-            cid=cid,
-            mev=mev,
-            res=res
-        )
-        print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
+        if DEBUG_LATENCY:
+            record_latency(cid=cid, mev=mev, res=res)
+            print(f"[LOCAL LATENCY]: {now() - local_start_ts}")
 
         if not res or not res.get("success"):
             rt["last_error"] = res.get("reason") if res else "UNKNOWN"
@@ -370,12 +322,12 @@ class CopyExequter:
         # orders_vars
         # --------------------------------------------------
         ov_root = rt.setdefault("orders_vars", {})
-        sym_root = ov_root.setdefault(mev.symbol, {})
-        side_root = sym_root.setdefault(mev.pos_side, {})
-
-        lock = side_root.setdefault("_lock", asyncio.Lock())
+        ov_key = (mev.symbol, mev.pos_side)
+        side_root = ov_root.get(ov_key)
+        if side_root is None:
+            side_root = ov_root[ov_key] = {}
 
-        async with lock:        
+        async with self._key_lock((cid, mev.symbol, mev.pos_side)):        
             # --------------------------------------------------
             # CANCEL (НЕ ЧЕРЕЗ INTENT)
             # --------------------------------------------------
@@ -388,26 +340,12 @@ class CopyExequter:
                 )
                 return
 
-            # --------------------------------------------------
-            # POSITION SNAPSHOT (FSM)
-            # --------------------------------------------------
-            if cid not in monitors:
-                monitors[cid] = PosMonitorFSM(
-                    rt["position_vars"],
-                    client.fetch_positions,
-                )
-
             # --------------------------------------------------
             # BUILD INTENT
             # --------------------------------------------------
             copy_pv = get_cid_symbol_pos(rt, mev.symbol, mev.pos_side)
 
-            spec = (
-                self.mc.pos_vars_root
-                .get("position_vars", {})
-                .get(mev.symbol, {})
-                .get("spec", {})
-            )
+            spec = self._get_spec(mev.symbol)
 
             intent: CopyOrderIntent | None = self.intent_factory.build(
                 cfg=cfg,
@@ -427,6 +365,17 @@ class CopyExequter:
                 )
                 return
 
+            # --------------------------------------------------
+            # POSITION SNAPSHOT (FSM) — только для состоявшегося intent
+            # --------------------------------------------------
+            if monitors.get(cid) is None:
+                monitors[cid] = PosMonitorFSM(
+                    rt["position_vars"],
+                    client.fetch_positions,
+                    rt.setdefault("open_positions", set()),
+                    partial(_mark_closed_pending, self.mc.closed_pending_index, cid),
+                )
+
             if intent.delay_ms and not mev.closed:
                 await asyncio.sleep(intent.delay_ms / 1000)                
 
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from typing import *
+from a_config import DEBUG_LATENCY
 from b_context import PosVarTemplate
 
 if TYPE_CHECKING:
@@ -35,7 +36,7 @@ def record_latency(
     No storage, no side effects.
     """
 
-    if not res or not isinstance(res, dict):
+    if not DEBUG_LATENCY or not res:
         return
 
     master_ts = getattr(mev, "ts", None)
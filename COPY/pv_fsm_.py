@@ -1,5 +1,7 @@
 # COPY.pv_fsm_.py
 
+import asyncio
+import sys
 from typing import *
 
 from b_context import PosVarTemplate
@@ -12,7 +14,14 @@ if TYPE_CHECKING:
     from API.MX.client import MexcClient
 
 
+# только примитивы → update() без копирования; НЕ мутировать
+_BASE_TEMPLATE: Dict[str, Any] = PosVarTemplate.base_template()
+_TS_TYPES = (int, float)   # _entry_ts: точный тип, без bool / подклассов
+
+
 class PreparePnlReport:    
+    FALLBACK_CONCURRENCY = 10   # одновременных get_realized_pnl при промахах batch
+
     def __init__(
         self,
         mc: "MainContext",
@@ -67,73 +76,85 @@ class PreparePnlReport:
 
         # ==================================================
         # 1) COLLECT ALL CLOSED_PENDING PV
+        #    + QUERIES PER ACCOUNT: (symbol, direction, entry_ts, end_ts)
         # ==================================================
         pv_items: List[Tuple[int, str, str, PosVarTemplate, "MexcClient"]] = []
+        by_client: Dict[int, Tuple["MexcClient", List[Tuple[str, int, int, int]]]] = {}
+
+        index = self.mc.closed_pending_index
+        wanted = set(ids)
+        copy_configs = self.mc.copy_configs
+        runtime_states = self.mc.copy_runtime_states
+        end_ts = now()
+
+        for key in [k for k in index if k[0] in wanted]:
+            cid, symbol, pos_side = key
 
-        for cid, cfg in self.mc.copy_configs.items():
+            cfg = copy_configs.get(cid)
             if cid == 0 or not cfg or not cfg.get("enabled"):
                 continue
-            if cid not in ids:
-                continue
 
-            rt = self.mc.copy_runtime_states.get(cid)
+            rt = runtime_states.get(cid)
             if not rt:
                 continue
 
-            position_vars = rt.get("position_vars") or {}
             mc_client: "MexcClient" = rt.get("mc_client")
             if not mc_client:
                 continue
 
-            for symbol, sides in position_vars.items():
-                for pos_side, pv in sides.items():
-                    if pv.get("_state") == "CLOSED_PENDING":
-                        pv_items.append((cid, symbol, pos_side, pv, mc_client))
-                        pv.pop("_state", None)
+            # ключ снимаем только у cid, который его обработал: выключенные / без клиента ждут
+            # своего прохода (при уничтожении runtime ключи снимает mc.drop_closed_pending)
+            index.discard(key)
+            pv = (rt.get("position_vars") or {}).get(symbol, {}).get(pos_side)
+            if not pv or pv.get("_state") != "CLOSED_PENDING":
+                continue
+            pv_items.append((cid, symbol, pos_side, pv, mc_client))
+            pv.pop("_state", None)
+
+            # невалидный entry_ts → промах batch, pv_cleanup залогирует
+            entry_ts = pv.get("_entry_ts")
+            if type(entry_ts) not in _TS_TYPES or entry_ts <= 1e10:
+                continue
+            direction = 1 if pos_side == "LONG" else 2
+            bucket = by_client.get(id(mc_client))
+            if bucket is None:
+                # закрытие обнаружено → кэш истории мог быть снят до него
+                mc_client.invalidate_pnl_index()
+                bucket = by_client[id(mc_client)] = (mc_client, [])
+            bucket[1].append((symbol, direction, entry_ts, end_ts))
 
         if not pv_items:
             return []
 
-        # ==================================================
-        # 2) TIME RANGE
-        # ==================================================
-        entry_ts_list = [
-            pv.get("_entry_ts")
-            for _, _, _, pv, _ in pv_items
-            if isinstance(pv.get("_entry_ts"), (int, float))
-        ]
-
-        if not entry_ts_list:
+        if not by_client:
             self.logger.warning("[ResetPV] no valid entry_ts for batch pnl")
             return []
 
-        start_ts = min(entry_ts_list)
-        end_ts = now()
-
         # ==================================================
-        # 3) BATCH FETCH (ONE REQUEST)
+        # 2) MULTI FETCH (ОДИН ЗАПРОС ИСТОРИИ НА АККАУНТ)
         # ==================================================
-        # берем любой клиент (API одинаковый)
-        _, _, _, _, mc_client_any = pv_items[0]
-
-        batch_map = await mc_client_any.get_realized_pnl_batch(
-            start_time=start_ts,
-            end_time=end_ts,
+        fetched = await asyncio.gather(
+            *[client.get_realized_pnl_multi(queries) for client, queries in by_client.values()],
+            return_exceptions=True,
         )
+        pnl_maps: Dict[int, Dict[Tuple[str, int], dict]] = {
+            client_id: (res if isinstance(res, dict) else {})
+            for client_id, res in zip(by_client, fetched)
+        }
 
         # ==================================================
-        # 4) APPLY RESULTS
+        # 3) APPLY RESULTS
         # ==================================================
-        for cid, symbol, pos_side, pv, mc_client in pv_items:
-            direction = 1 if pos_side == "LONG" else 2
-            key = (symbol, direction)
+        results: List[Optional[dict]] = [None] * len(pv_items)
+        missed: List[int] = []
 
-            res: Optional[dict] = None
+        for i, (cid, symbol, pos_side, pv, mc_client) in enumerate(pv_items):
+            direction = 1 if pos_side == "LONG" else 2
+            pnl = pnl_maps.get(id(mc_client), {}).get((symbol, direction))
 
-            # ---- batch hit ----
-            if batch_map and key in batch_map:
-                pnl = batch_map[key]
-                res = {
+            # ---- multi hit ----
+            if pnl is not None:
+                results[i] = {
                     "cid": cid,
                     "symbol": symbol,
                     "pos_side": pos_side,
@@ -144,76 +165,112 @@ class PreparePnlReport:
 
                 if "_entry_ts" in pv: pv.pop("_entry_ts", None)
 
-            # ---- fallback (safe) ----
             else:
-                res = await self.pv_cleanup(
-                    mc_client.get_realized_pnl,
-                    pv,
-                    symbol,
-                    pos_side,
-                )
+                missed.append(i)
+
+        # ---- fallback (safe): промахи batch — конкурентно, не более N запросов ----
+        if missed:
+            sem = asyncio.Semaphore(self.FALLBACK_CONCURRENCY)
+
+            async def _cleanup(item: Tuple[int, str, str, PosVarTemplate, "MexcClient"]):
+                _, symbol, pos_side, pv, mc_client = item
+                async with sem:
+                    return await self.pv_cleanup(
+                        mc_client.get_realized_pnl,
+                        pv,
+                        symbol,
+                        pos_side,
+                    )
+
+            gathered = await asyncio.gather(
+                *[_cleanup(pv_items[i]) for i in missed],
+                return_exceptions=True,
+            )
+
+            for i, res in zip(missed, gathered):
+                if isinstance(res, BaseException):
+                    self.logger.warning(f"[ResetPV] fallback pnl failed: {res}")
+                    continue
                 if res:
+                    cid, _, _, pv, _ = pv_items[i]
                     res["cid"] = cid
                     pv.pop("_entry_ts", None)
+                    results[i] = res
 
-            if res: all_finish_results.append(res)
+        all_finish_results.extend(res for res in results if res)
 
         return all_finish_results
 
 
+# ==================================================
+# MEXC POSITION UNPACK
+# ==================================================
+_HOLDING = 1                                # state: 1=holding, 2=system-held, 3=closed
+_POS_SIDES = {1: "LONG", 2: "SHORT"}        # positionType
+
+
+def _unpack(
+    position: dict,
+    _sf: Callable = Utils.safe_float,
+    _si: Callable = Utils.safe_int,
+) -> Optional[dict]:
+    """
+    MEXC position → normalized dict
+
+    Возвращает None если:
+    • мусор
+    • не holding
+    • объём <= 0
+    """
+
+    if not isinstance(position, dict):
+        return None
+
+    get = position.get
+    if get("state") != _HOLDING:
+        return None
+
+    symbol = get("symbol")
+    pos_side = _POS_SIDES.get(get("positionType"))
+
+    vol = abs(_sf(get("holdVol"), 0.0))
+    if not symbol or vol <= 0 or pos_side is None:
+        return None
+
+    if type(symbol) is str:
+        symbol = sys.intern(symbol)
+
+    return {
+        "symbol": symbol,
+        "pos_side": pos_side,
+        "qty": vol,
+        "entry_price": _sf(get("openAvgPrice")),
+        "avg_price": _sf(get("holdAvgPrice")),
+        "leverage": _si(get("leverage"), 1),
+        "margin_mode": _si(get("openType"), 1),
+    }
+
+
 class PosMonitorFSM:
     """
     """
     def __init__(
         self,
         position_vars: Dict[str, Dict[str, Dict[str, Any]]],
-        fetch_positions: Callable
+        fetch_positions: Callable,
+        open_positions: Optional[Set[Tuple[str, str]]] = None,
+        on_closed_pending: Optional[Callable[[str, str], None]] = None,
     ):
         self.position_vars = position_vars
         self.fetch_positions = fetch_positions
+        self.on_closed_pending = on_closed_pending
+        # индекс открытых (symbol, side) — синхронизируется вместе с in_position
+        self.open_positions = open_positions if open_positions is not None else set()
+        # сигнатура последнего применённого снапшота (повторные refresh из watcher'а)
+        self._last_sig: Optional[int] = None
 
     # --------------------------------------------------
-    @staticmethod
-    def unpack(position: dict) -> Optional[dict]:
-        """
-        MEXC position → normalized dict
-
-        Возвращает None если:
-        • мусор
-        • не holding
-        • объём <= 0
-        """
-
-        if not isinstance(position, dict):
-            return None
-
-        # state: 1=holding, 2=system-held, 3=closed
-        if position.get("state") != 1:
-            return None
-
-        symbol = position.get("symbol")
-        pos_type_int = position.get("positionType")  # 1=LONG, 2=SHORT
-
-        vol = abs(Utils.safe_float(position.get("holdVol"), 0.0))
-        if not symbol or vol <= 0:
-            return None
-
-        if pos_type_int == 1:
-            pos_side = "LONG"
-        elif pos_type_int == 2:
-            pos_side = "SHORT"
-        else:
-            return None
-
-        return {
-            "symbol": symbol,
-            "pos_side": pos_side,
-            "qty": vol,
-            "entry_price": Utils.safe_float(position.get("openAvgPrice")),
-            "avg_price": Utils.safe_float(position.get("holdAvgPrice")),
-            "leverage": Utils.safe_int(position.get("leverage"), 1),
-            "margin_mode": Utils.safe_int(position.get("openType"), 1),
-        }
+    unpack = staticmethod(_unpack)
 
     # --------------------------------------------------
     async def refresh(self) -> None:
@@ -229,55 +286,77 @@ class PosMonitorFSM:
             return
 
         active: Dict[Tuple[str, str], dict] = {}
+        position_vars = self.position_vars
 
         for raw in positions:
-            info = self.unpack(raw)
+            # символы вне position_vars всё равно не применяются — не распаковываем
+            if not isinstance(raw, dict) or raw.get("symbol") not in position_vars:
+                continue
+            info = _unpack(raw)
             if not info:
                 continue
             key = (info["symbol"], info["pos_side"])
             active[key] = info
 
+        # -------- SNAPSHOT UNCHANGED → NOTHING TO APPLY --------
+        sig = hash(frozenset(
+            (key, info["qty"], info["avg_price"], info["leverage"], info["margin_mode"])
+            for key, info in active.items()
+        ))
+        if sig == self._last_sig:
+            return
+        self._last_sig = sig
+
         now_ts = now()
+        open_positions = self.open_positions
 
         # -------- APPLY SNAPSHOT --------
-        for symbol, sides in self.position_vars.items():
-            for pos_side, pv in sides.items():
-                key = (symbol, pos_side)
-                was_in_position = bool(pv.get("in_position"))
-
-                # ---------- POSITION EXISTS ----------
-                if key in active:
-                    info = active[key]
-                    is_in_position = info["qty"] > 0
-
-                    # ---- NEW ENTRY ----
-                    if is_in_position and not was_in_position:
-                        pv.update({
-                            "in_position": True,
-                            "qty": info["qty"],
-                            "entry_price": info["entry_price"],
-                            "avg_price": info["avg_price"],
-                            "leverage": info["leverage"],
-                            "margin_mode": info["margin_mode"],
-                            "_entry_ts": now_ts,
-                        })
-                        continue
-
-                    # ---- CONTINUE POSITION ----
-                    if is_in_position and was_in_position:
-                        pv.update({
-                            "in_position": True,
-                            "qty": info["qty"],
-                            "avg_price": info["avg_price"],
-                            "leverage": info["leverage"],
-                            "margin_mode": info["margin_mode"],
-                        })
-                        continue
-
-                # ---------- POSITION NOT FOUND ----------
-                if was_in_position:
-                    # 🔥 REAL RESET PV
-                    entry_ts = pv.get("_entry_ts")
-                    pv.update(PosVarTemplate.base_template())
-                    pv["_entry_ts"] = entry_ts
-                    pv["_state"]= "CLOSED_PENDING"
+        # плоский индекс PV: (symbol, side) → pv
+        pv_index: Dict[Tuple[str, str], Dict[str, Any]] = {
+            (symbol, pos_side): pv
+            for symbol, sides in position_vars.items()
+            for pos_side, pv in sides.items()
+        }
+
+        # ---------- POSITION EXISTS ----------
+        for key, info in active.items():
+            pv = pv_index.get(key)
+            if pv is None or info["qty"] <= 0:
+                continue
+            del pv_index[key]
+
+            # ---- NEW ENTRY ----
+            if not pv.get("in_position"):
+                pv.update({
+                    "in_position": True,
+                    "qty": info["qty"],
+                    "entry_price": info["entry_price"],
+                    "avg_price": info["avg_price"],
+                    "leverage": info["leverage"],
+                    "margin_mode": info["margin_mode"],
+                    "_entry_ts": now_ts,
+                })
+
+            # ---- CONTINUE POSITION ----
+            else:
+                pv.update({
+                    "in_position": True,
+                    "qty": info["qty"],
+                    "avg_price": info["avg_price"],
+                    "leverage": info["leverage"],
+                    "margin_mode": info["margin_mode"],
+                })
+            open_positions.add(key)
+
+        # ---------- POSITION NOT FOUND ----------
+        for key, pv in pv_index.items():
+            if not pv.get("in_position"):
+                continue
+            open_positions.discard(key)
+            # 🔥 REAL RESET PV
+            entry_ts = pv.get("_entry_ts")
+            pv.update(_BASE_TEMPLATE)
+            pv["_entry_ts"] = entry_ts
+            pv["_state"]= "CLOSED_PENDING"
+            if self.on_closed_pending:
+                self.on_closed_pending(*key)
@@ -3,18 +3,18 @@
 from __future__ import annotations
 
 import asyncio
-import copy
 import random
 import math
 from typing import *
 from dataclasses import dataclass
 
 from a_config import SESSION_TTL, FALLBACK_LEVERAGE, FALLBACK_MARGIN_MODE
-from b_context import COPY_RUNTIME_STATE
+from b_context import make_runtime_state
 
-from c_utils import now, Utils
+from c_utils import now, Utils, DC_SLOTS
 from b_network import NetworkManager
 from API.MX.client import MexcClient
+from TG.notifier_ import IntentDropLog
 
 if TYPE_CHECKING:
     from b_context import MainContext
@@ -138,10 +138,10 @@ class CopyState:
             if rt.get("init_state") == "FAILED":
                 # разрешаем повторную попытку
                 self.mc.copy_runtime_states.pop(cid, None)
+                self.mc.drop_closed_pending(cid)
 
         # ---- CREATE RUNTIME SKELETON ----
-        rt = copy.deepcopy(COPY_RUNTIME_STATE)
-        rt["id"] = cid
+        rt = make_runtime_state(cid)
         rt["init_state"] = "INIT"
         rt["network_ready"] = False
 
@@ -208,6 +208,7 @@ class CopyState:
         """
 
         rt = self.mc.copy_runtime_states.pop(cid, None)
+        self.mc.drop_closed_pending(cid)
         if not rt:
             return
 
@@ -225,7 +226,7 @@ class CopyState:
         self.logger.info(f"[CopyState:{cid}] runtime destroyed")
 
 
-@dataclass
+@dataclass(**DC_SLOTS)
 class CopyOrderIntent:
     # --- required ---
     symbol: str
@@ -246,6 +247,75 @@ class CopyOrderIntent:
     delay_ms: int = 0
 
 
+# единый генератор для random size / delay
+_rng = random.Random()
+
+
+# ==================================================
+# PRICE FORMAT
+# ==================================================
+def _make_price_formatter(precision: Optional[int]) -> Callable[[Any], Optional[str]]:
+    """
+    Форматтер цены с зафиксированной precision (один на build).
+    """
+    sf = Utils.safe_float
+    to_h = Utils.to_human_digit
+
+    if precision is None:
+        return lambda v: None if v is None else to_h(sf(v))
+    return lambda v: None if v is None else to_h(round(sf(v), precision))
+
+
+# ==================================================
+# CLAMP KERNEL
+# ==================================================
+def _clamp_kernel(
+    contracts: float,
+    max_margin: float,
+    price: float,
+    leverage: float,
+    coef: float,
+    rnd: float,
+    contract_size: float,
+    vol_unit: float,
+    precision: int,
+) -> float:
+    """
+    Чистая скалярная арифметика клампа (без dict / None).
+    Все проверки входа — на стороне _clamp_by_max_margin.
+    """
+
+    margin = (contracts * contract_size * price) / leverage
+
+    # 1️⃣ COEF
+    if coef != 0.0 and coef != 1.0:
+        margin *= abs(coef)
+
+    # 2️⃣ RANDOM SIZE
+    if rnd != 0.0 and rnd != 100.0:
+        margin *= abs(rnd / 100)
+
+    if margin and max_margin and margin >= max_margin:
+        margin = abs(max_margin)
+
+    elif not margin:
+        return 0.0
+
+    # считаем объём в базовой валюте
+    base_qty = (margin * leverage) / price
+    # переводим в контракты
+    contracts = base_qty / contract_size
+
+    # contracts = round(contracts / vol_unit) * vol_unit
+    contracts = math.floor(contracts / vol_unit) * vol_unit
+    contracts = round(contracts, precision)
+
+    if not math.isfinite(contracts) or contracts <= 0:
+        return 0.0
+
+    return contracts
+
+
 class CopyOrderIntentFactory:
     """
     Единственная точка кастомизации ИНИЦИИРУЮЩИХ ордеров.
@@ -257,34 +327,11 @@ class CopyOrderIntentFactory:
 
     # --------------------------------------------------
     def _log_drop(self, cid, mev, reason: str, **extra):
-        parts = [
-            f"{mev.symbol} {mev.pos_side}",
-            f"INTENT DROP",
-            f"reason={reason}",
-            f"event={mev.event}",
-            f"method={mev.method}",
-        ]
-
-        if extra:
-            extras = ", ".join(f"{k}={v}" for k, v in extra.items())
-            parts.append(extras)
-
+        # форматирование — в FormatUILogs.flush_log_events
         self.mc.log_events.append(
-            (cid, " :: ".join(parts))
-            # (cid, " :: ".join(parts), now())
+            (cid, IntentDropLog(mev.symbol, mev.pos_side, reason, mev.event, mev.method, extra))
         )
 
-    # --------------------------------------------------
-    def _fmt_price(self, value, precision):
-        if value is None:
-            return None
-        raw = Utils.safe_float(value)
-        if raw is None:
-            return None
-        if precision is not None:
-            raw = round(raw, precision)
-        return Utils.to_human_digit(raw)
-
     # --------------------------------------------------
     @staticmethod
     def _clamp_by_max_margin(
@@ -313,41 +360,17 @@ class CopyOrderIntentFactory:
         if not contract_size or not vol_unit or precision is None:
             return contracts
 
-        margin = (contracts * contract_size * price) / leverage
-
-        # --------------------------------------------------
-        # 1️⃣ COEF
-        # --------------------------------------------------            
-        if coef and coef not in (0, 1):
-            margin *= abs(coef)
-
-        # --------------------------------------------------
-        # 2️⃣ RANDOM SIZE
-        # --------------------------------------------------
-        
-        if rnd and rnd not in (0, 100):
-            margin *= abs(rnd / 100)
-
-        if margin and max_margin and margin >= max_margin:
-            margin = abs(float(max_margin))
-
-        elif not margin:
-            return 0.0 
-
-        # считаем объём в базовой валюте
-        base_qty = (margin * leverage) / price
-        # переводим в контракты
-        contracts = base_qty / contract_size
-
-        # contracts = round(contracts / vol_unit) * vol_unit
-        contracts = math.floor(contracts / vol_unit) * vol_unit
-        contracts = round(contracts, precision)
-
-
-        if not math.isfinite(contracts) or contracts <= 0:
-            return 0.0
-
-        return contracts
+        return _clamp_kernel(
+            float(contracts),
+            float(max_margin or 0.0),
+            float(price),
+            float(leverage),   # дробное плечо не усекаем
+            float(coef or 0.0),
+            float(rnd or 0.0),
+            float(contract_size),
+            float(vol_unit),
+            int(precision),
+        )
 
     # --------------------------------------------------
     def build(
@@ -358,6 +381,10 @@ class CopyOrderIntentFactory:
         spec: Dict
     ) -> Optional[CopyOrderIntent]:
 
+        sf = Utils.safe_float
+        fmt = _make_price_formatter(spec.get("price_precision") if spec else None)
+        uniform = _rng.uniform
+
         payload = mev.payload or {}
         cid = cfg.get("cid", "?")
 
@@ -412,17 +439,18 @@ class CopyOrderIntentFactory:
 
         sl_price = tp_price = price = trigger_price = None
 
-        max_margin = Utils.safe_float(cfg.get("max_position_size"))
+        max_margin = sf(cfg.get("max_position_size"))
 
-        coef = Utils.safe_float(cfg.get("coef", 1.0)) or 1.0
-        lo, hi = Utils.safe_float(cfg.get("random_size_pct", [0.0, 0.0])[0]), Utils.safe_float(cfg.get("random_size_pct", [0.0, 0.0])[1])
+        coef = sf(cfg.get("coef", 1.0)) or 1.0
+        rsp = cfg.get("random_size_pct") or (0.0, 0.0)
+        lo, hi = sf(rsp[0]), sf(rsp[1])
         rnd = 100
-        if lo or hi and hi > lo:
-            rnd = random.uniform(lo, hi)
+        if (lo or hi) and hi >= lo >= 0:
+            rnd = uniform(lo, hi)
 
         qty = None
-        payload_qty = Utils.safe_float(payload.get("qty"))
-        copy_pv_qty = Utils.safe_float(copy_pv.get("qty"))
+        payload_qty = sf(payload.get("qty"))
+        copy_pv_qty = sf(copy_pv.get("qty"))
         changing_qty_flag = (coef not in (0, 1, None)) or lo or hi or max_margin
 
         # --------------------------------------------------
@@ -434,18 +462,17 @@ class CopyOrderIntentFactory:
             delay_cfg = cfg.get("delay_ms", [0, 0])
 
             if isinstance(delay_cfg, (list, tuple)) and len(delay_cfg) == 2:
-                lo, hi = Utils.safe_float(delay_cfg[0]), Utils.safe_float(delay_cfg[1])
+                lo, hi = sf(delay_cfg[0]), sf(delay_cfg[1])
                 lo, hi = abs(lo), abs(hi)
                 if hi > lo:
-                    delay_ms = int(random.uniform(lo, hi))
+                    delay_ms = int(uniform(lo, hi))
             elif isinstance(delay_cfg, (int, float)):
                 delay_ms = int(delay_cfg)
 
         # --------------------------------------------------
         # 6️⃣ PROCE
         # --------------------------------------------------
-        price_precision = spec.get("price_precision") if spec else None
-        price = self._fmt_price(payload.get("price"), price_precision)
+        price = fmt(payload.get("price"))
 
         # ==================================================
         # CLOSE
@@ -470,7 +497,7 @@ class CopyOrderIntentFactory:
             # --------------------------------------------------
             if changing_qty_flag:
                 raw_price = payload.get("price") or copy_pv.get("entry_price")
-                price_f = Utils.safe_float(raw_price)
+                price_f = sf(raw_price)
 
                 qty = self._clamp_by_max_margin(
                     contracts=qty,
@@ -496,9 +523,9 @@ class CopyOrderIntentFactory:
             # --------------------------------------------------
             # PRICES
             # --------------------------------------------------
-            trigger_price = self._fmt_price(payload.get("trigger_price"), price_precision)
-            sl_price = self._fmt_price(payload.get("sl_price"), price_precision)
-            tp_price = self._fmt_price(payload.get("tp_price"), price_precision)
+            trigger_price = fmt(payload.get("trigger_price"))
+            sl_price = fmt(payload.get("sl_price"))
+            tp_price = fmt(payload.get("tp_price"))
 
         return CopyOrderIntent(
             symbol=mev.symbol,
@@ -3,10 +3,11 @@
 from __future__ import annotations
 
 import asyncio
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
 from typing import *
 
-from c_utils import Utils, now
+from c_utils import Utils, now, DC_SLOTS
 from MASTER.state_ import PosVarSetup
 
 if TYPE_CHECKING:
@@ -21,11 +22,16 @@ if TYPE_CHECKING:
 HL_EVENT = Literal["buy", "sell", "canceled"]
 METHOD = Literal["market", "limit", "trigger"]
 
+LIMIT_INTENTS_MAX = 4096
+
+_SIDE_FLIP: Dict[str, str] = {"LONG": "SHORT", "SHORT": "LONG"}
+_OPEN_SIDE_CODES: FrozenSet[int] = frozenset((1, 3))   # MEXC side: 1=open long, 3=open short
+
 
 # =====================================================================
 # MASTER EVENT
 # =====================================================================
-@dataclass
+@dataclass(**DC_SLOTS)
 class MasterEvent:
     event: HL_EVENT
     method: METHOD
@@ -35,6 +41,28 @@ class MasterEvent:
     payload: Dict[str, Any]
     sig_type: Literal["copy", "manual"]
     ts: int = field(default_factory=now)
+    # привязка manual-close sub-event к конкретному copy-id (см. CopyDestrib)
+    _cid: Optional[int] = field(default=None, repr=False, compare=False)
+
+
+# ==================================================
+_safe_float = Utils.safe_float
+
+
+def _base_payload(raw: dict) -> dict:
+    get = raw.get
+    return {
+        "order_id": get("orderId"),
+        "qty": _safe_float(get("vol")),
+        "price": _safe_float(
+            get("price")
+            or get("dealAvgPrice")
+            or get("avgPrice")
+        ),
+        "leverage": get("leverage"),
+        "open_type": get("openType"),
+        "reduce_only": bool(get("reduceOnly")),
+    }
 
 
 # ==================================================
@@ -78,18 +106,35 @@ class MasterPayload:
         self.logger = logger
         self.stop_flag = stop_flag
 
-        self._pending: list[MasterEvent] = []
+        self._pending: Deque[MasterEvent] = deque()
         self._stop = False
 
         self.out_queue = asyncio.Queue(maxsize=1000)
 
-        # anti-double fire для limit
-        self._limit_intents: set[str] = set()
+        # anti-double fire для limit (LRU: потерянные cancel не копятся вечно)
+        self._limit_intents: "OrderedDict[str, None]" = OrderedDict()
+
+        # (symbol, side) → PV dict из pos_vars_root; валиден, пока mc.pos_vars_version == _pv_ref_ver
+        self._pv_ref_cache: Dict[Tuple[str, str], dict] = {}
+        self._pv_ref_ver: int = -1
+
+        # event_type → handler (один dict lookup вместо if-лестницы)
+        self._handlers: Dict[str, Callable[["SignalEvent", str, str, dict], None]] = {
+            "oco_attached": self._on_oco,
+            "market_filled": self._on_market,
+            "limit_filled": self._on_limit_filled,
+            "limit_placed": self._on_limit_placed,
+            "trigger_filled": self._on_trigger,
+            "order_cancelled": self._on_cancel,
+            "order_invalid": self._on_cancel,
+        }
 
     # ==================================================
     def stop(self):
         self._stop = True
         Utils.clear_runtime_positions(pos_vars_root=self.mc.pos_vars_root)
+        self.mc.pos_vars_version += 1   # PV пересобраны → ссылки в кэшах недействительны
+        self._pv_ref_cache.clear()
         self.logger.info("MasterPayload: stop requested")
 
     # ==================================================
@@ -98,166 +143,222 @@ class MasterPayload:
 
         while not self._stop and not self.stop_flag():
             await self.cache._event_notify.wait()
-            events = await self.cache.pop_events()
+            events = self.cache.pop_events()
+            release = self.cache.pool.release
 
             for ev in events:
                 self._route(ev)
+                release(ev)
 
-            for mev in self._pending:
-                await self.out_queue.put(mev)
-
-            self._pending.clear()
+            await self._flush_pending()
 
         self.logger.info("MasterPayload STOPPED")
 
     # ==================================================
+    async def _flush_pending(self):
+        """
+        _pending → out_queue.
+        • put_nowait без future на каждый event
+        • очередь полна: canceled — дроп, buy/sell — ждём место (без потерь)
+        """
+        pending = self._pending
+        out_queue = self.out_queue
+        put_nowait = out_queue.put_nowait
+        popleft = pending.popleft
+
+        while pending:
+            try:
+                # быстрый путь: try вне цикла, без обработки на каждый event
+                while pending:
+                    put_nowait(pending[0])
+                    popleft()
+            except asyncio.QueueFull:
+                mev = popleft()
+                if mev.event == "canceled":
+                    self.logger.warning(
+                        f"MasterPayload: out_queue full, drop canceled {mev.symbol} {mev.pos_side}"
+                    )
+                    continue
+                self.logger.warning(
+                    f"MasterPayload: out_queue full, backpressure on {mev.event} {mev.symbol} {mev.pos_side}"
+                )
+                await out_queue.put(mev)
+
+    # ==================================================
+    def _pv_ref(self, symbol: str, pos_side: str) -> Optional[dict]:
+        """
+        Кэшированная ссылка на PV мастера. Пересборка PV (reset / clear / новые инструменты)
+        поднимает mc.pos_vars_version — тогда кэш сбрасывается целиком.
+        """
+        if self._pv_ref_ver != self.mc.pos_vars_version:
+            self._pv_ref_cache.clear()
+            self._pv_ref_ver = self.mc.pos_vars_version
+
+        key = (symbol, pos_side)
+        pv = self._pv_ref_cache.get(key)
+        if pv is None:
+            sym = self.mc.pos_vars_root.get(symbol)
+            pv = sym.get(pos_side) if sym else None
+            if pv is not None:
+                self._pv_ref_cache[key] = pv
+        return pv
+
     def _ensure_pv(self, symbol: str, pos_side: str) -> dict:
+        pv = self._pv_ref(symbol, pos_side)
+        if pv is not None:
+            return pv
+
+        root = self.mc.pos_vars_root
+        if symbol not in root:
+            self.mc.pos_vars_version += 1   # новый символ → новый spec
         PosVarSetup.set_pos_defaults(
-            self.mc.pos_vars_root,
+            root,
             symbol,
             pos_side,
             instruments_data=self.mc.instruments_data,
         )
-        return self.mc.pos_vars_root[symbol][pos_side]
+        pv = self._pv_ref_cache[(symbol, pos_side)] = root[symbol][pos_side]
+        self._pv_ref_ver = self.mc.pos_vars_version
+        return pv
 
     # ==================================================
     def _route(self, ev: "SignalEvent"):
-        et = ev.event_type
         symbol, pos_side = ev.symbol, ev.pos_side
         if not symbol or not pos_side:
             return
 
-        raw = ev.raw or {}
+        handler = self._handlers.get(ev.event_type)
+        if handler is not None:
+            handler(ev, symbol, pos_side, ev.raw or {})
 
-        # ==================================================
-        # OCO STATE (НЕ СИГНАЛ)
-        # ==================================================
-        if et == "oco_attached":
-            pv = self._ensure_pv(symbol, pos_side)
+    # ==================================================
+    # OCO STATE (НЕ СИГНАЛ)
+    # ==================================================
+    def _on_oco(self, ev: "SignalEvent", symbol: str, pos_side: str, raw: dict):
+        pv = self._ensure_pv(symbol, pos_side)
 
-            tp = Utils.safe_float(raw.get("tp"))
-            sl = Utils.safe_float(raw.get("sl"))
+        tp = _safe_float(raw.get("tp"))
+        sl = _safe_float(raw.get("sl"))
 
-            if tp is not None:
-                pv["_attached_tp"] = tp
-            if sl is not None:
-                pv["_attached_sl"] = sl
+        if tp is not None:
+            pv["_attached_tp"] = tp
+        if sl is not None:
+            pv["_attached_sl"] = sl
 
-            return
+    # ==================================================
+    # MARKET FILLED
+    # ==================================================
+    def _on_market(self, ev: "SignalEvent", symbol: str, pos_side: str, raw: dict):
+        reduce_only = bool(raw.get("reduceOnly"))
+        is_close = reduce_only
+
+        emit_side = pos_side
+        if is_close:
+            emit_side = _SIDE_FLIP[pos_side]
+
+        payload = _base_payload(raw)
+
+        self._inject_oco_from_intent(payload, symbol, emit_side)
+
+        self._emit(
+            event="sell" if is_close else "buy",
+            method="market",
+            symbol=symbol,
+            pos_side=emit_side,
+            closed=is_close,
+            payload=payload,
+            ev_raw=ev,
+        )
 
-        # ==================================================
-        # MARKET FILLED
-        # ==================================================
-        if et == "market_filled":
-            reduce_only = bool(raw.get("reduceOnly"))
-            is_close = reduce_only
-
-            emit_side = pos_side
-            if is_close:
-                emit_side = {"LONG": "SHORT", "SHORT": "LONG"}[pos_side]
-
-            payload = self._base_payload(raw)
-
-            self._inject_oco_from_intent(payload, symbol, emit_side)
-
-            self._emit(
-                event="sell" if is_close else "buy",
-                method="market",
-                symbol=symbol,
-                pos_side=emit_side,
-                closed=is_close,
-                payload=payload,
-                ev_raw=ev,
-            )
-            return
+    # ==================================================
+    # LIMIT FILLED
+    # ==================================================
+    def _on_limit_filled(self, ev: "SignalEvent", symbol: str, pos_side: str, raw: dict):
+        oid = raw.get("orderId")
 
-        # ==================================================
-        # LIMIT FILLED
-        # ==================================================
-        if et == "limit_filled":
-            oid = raw.get("orderId")
-
-            # intent → не сигнал
-            if oid in self._limit_intents:
-                self._limit_intents.discard(oid)
-                return
-
-            payload = self._base_payload(raw)
-            self._inject_oco_from_intent(payload, symbol, pos_side)
-
-            self._emit(
-                event="buy",
-                method="limit",
-                symbol=symbol,
-                pos_side=pos_side,
-                closed=False,
-                payload=payload,
-                ev_raw=ev,
-            )
+        # intent → не сигнал
+        if oid in self._limit_intents:
+            self._limit_intents.pop(oid, None)
             return
 
-        # ==================================================
-        # LIMIT PLACED (INTENT)
-        # ==================================================
-        if et == "limit_placed":
-            oid = raw.get("orderId")
-            if oid:
-                self._limit_intents.add(oid)
-
-            self._emit(
-                event="buy",
-                method="limit",
-                symbol=symbol,
-                pos_side=pos_side,
-                closed=False,
-                payload=self._base_payload(raw),
-                ev_raw=ev,
-            )
-            return
+        payload = _base_payload(raw)
+        self._inject_oco_from_intent(payload, symbol, pos_side)
+
+        self._emit(
+            event="buy",
+            method="limit",
+            symbol=symbol,
+            pos_side=pos_side,
+            closed=False,
+            payload=payload,
+            ev_raw=ev,
+        )
 
-        # ==================================================
-        # TRIGGER FILLED
-        # ==================================================
-        if et == "trigger_filled":
-            reduce_only = bool(raw.get("reduceOnly"))
-            is_sell = raw.get("side") not in (1, 3)
-
-            emit_side = pos_side
-            if reduce_only:
-                emit_side = {"LONG": "SHORT", "SHORT": "LONG"}[pos_side]
-
-            payload = self._base_payload(raw)
-            self._inject_oco_from_intent(payload, symbol, emit_side)
-
-            self._emit(
-                event="sell" if is_sell else "buy",
-                method="trigger",
-                symbol=symbol,
-                pos_side=emit_side,
-                closed=reduce_only,
-                payload=payload,
-                ev_raw=ev,
-            )
-            return
+    # ==================================================
+    # LIMIT PLACED (INTENT)
+    # ==================================================
+    def _on_limit_placed(self, ev: "SignalEvent", symbol: str, pos_side: str, raw: dict):
+        oid = raw.get("orderId")
+        if oid:
+            intents = self._limit_intents
+            intents[oid] = None
+            intents.move_to_end(oid)
+            while len(intents) > LIMIT_INTENTS_MAX:
+                intents.popitem(last=False)
+
+        payload = _base_payload(raw)
+
+        self._emit(
+            event="buy",
+            method="limit",
+            symbol=symbol,
+            pos_side=pos_side,
+            closed=False,
+            payload=payload,
+            ev_raw=ev,
+        )
 
-        # ==================================================
-        # CANCEL
-        # ==================================================
-        if et in ("order_cancelled", "order_invalid"):
-            oid = raw.get("orderId")
-            if oid:
-                self._limit_intents.discard(oid)
-
-            self._emit(
-                event="canceled",
-                method="limit",
-                symbol=symbol,
-                pos_side=pos_side,
-                closed=False,
-                payload={"order_id": oid},
-                ev_raw=ev,
-            )
-            return
+    # ==================================================
+    # TRIGGER FILLED
+    # ==================================================
+    def _on_trigger(self, ev: "SignalEvent", symbol: str, pos_side: str, raw: dict):
+        reduce_only = bool(raw.get("reduceOnly"))
+        is_sell = ev.side_code not in _OPEN_SIDE_CODES
+
+        emit_side = pos_side
+        if reduce_only:
+            emit_side = _SIDE_FLIP[pos_side]
+
+        payload = _base_payload(raw)
+        self._inject_oco_from_intent(payload, symbol, emit_side)
+
+        self._emit(
+            event="sell" if is_sell else "buy",
+            method="trigger",
+            symbol=symbol,
+            pos_side=emit_side,
+            closed=reduce_only,
+            payload=payload,
+            ev_raw=ev,
+        )
+
+    # ==================================================
+    # CANCEL
+    # ==================================================
+    def _on_cancel(self, ev: "SignalEvent", symbol: str, pos_side: str, raw: dict):
+        oid = raw.get("orderId")
+        if oid:
+            self._limit_intents.pop(oid, None)
+
+        self._emit(
+            event="canceled",
+            method="limit",
+            symbol=symbol,
+            pos_side=pos_side,
+            closed=False,
+            payload={"order_id": oid},
+            ev_raw=ev,
+        )
 
     # ==================================================
     def _inject_oco_from_intent(self, payload: dict, symbol: str, pos_side: str):
@@ -266,13 +367,17 @@ class MasterPayload:
         Подмешивается ОДИН РАЗ.
         """
 
-        pv = self.mc.pos_vars_root.get(symbol, {}).get(pos_side)
+        pv = self._pv_ref(symbol, pos_side)
         if not pv:
             return
 
         tp = pv.get("_attached_tp")
         sl = pv.get("_attached_sl")
 
+        # нет OCO (частый случай) → нечего подмешивать и сбрасывать
+        if tp is None and sl is None:
+            return
+
         if tp is not None:
             payload["tp_price"] = tp
         if sl is not None:
@@ -282,22 +387,6 @@ class MasterPayload:
         pv["_attached_tp"] = None
         pv["_attached_sl"] = None
 
-    # ==================================================
-    @staticmethod
-    def _base_payload(raw: dict) -> dict:
-        return {
-            "order_id": raw.get("orderId"),
-            "qty": Utils.safe_float(raw.get("vol")),
-            "price": Utils.safe_float(
-                raw.get("price")
-                or raw.get("dealAvgPrice")
-                or raw.get("avgPrice")
-            ),
-            "leverage": raw.get("leverage"),
-            "open_type": raw.get("openType"),
-            "reduce_only": bool(raw.get("reduceOnly")),
-        }
-
     # ==================================================
     def _emit(
         self,
@@ -312,22 +401,14 @@ class MasterPayload:
         sig_type: Literal["copy", "manual"] = "copy",
     ):  
         ts = now()   
-        exec_ts = _extract_exchange_ts(ev_raw=ev_raw)
-        tech_ts = ev_raw.ts if ev_raw else now()
+        exec_ts = _extract_exchange_ts(ev_raw)
+        tech_ts = ev_raw.ts if ev_raw else ts
         if exec_ts and tech_ts: ts = min(exec_ts, tech_ts)
 
-        payload = dict(payload)
+        # payload принадлежит _emit: все вызовы передают свежий dict
         payload["exec_ts"] = exec_ts
 
+        # позиционно — порядок полей MasterEvent
         self._pending.append(
-            MasterEvent(
-                event=event,
-                method=method,
-                symbol=symbol,
-                pos_side=pos_side,
-                closed=closed,
-                payload=payload,
-                sig_type=sig_type,
-                ts=ts,
-            )
+            MasterEvent(event, method, symbol, pos_side, closed, payload, sig_type, ts)
         )
\ No newline at end of file
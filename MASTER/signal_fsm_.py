@@ -3,14 +3,13 @@
 from __future__ import annotations
 
 import asyncio
-import hashlib
 from typing import *
 
 from COPY.copy_ import CopyDestrib
 from .stream_ import MasterSignalStream
 from .payload_ import MasterPayload
 from .state_ import SignalCache
-from c_utils import now, Utils
+from c_utils import Utils
 
 if TYPE_CHECKING:
     from COPY.state_ import CopyState
@@ -18,23 +17,38 @@ if TYPE_CHECKING:
     from c_log import UnifiedLogger
 
 
+SUPERVISOR_IDLE_SEC = 1.0     # макс. пауза supervisor без изменений конфигов
+STOP_TASK_TIMEOUT_SEC = 5.0   # ожидание завершения отменённой задачи
+WS_READY_TIMEOUT_SEC = 15.0   # старт WS мастера (connect + login)
+WS_READY_POLL_SEC = 0.2       # проверка stop_flag во время ожидания старта WS
+# copy signal_loop при отмене дренирует уведомления — ждём и этот бюджет, чтобы не поднять новый loop поверх старого
+COPY_STOP_TIMEOUT_SEC = STOP_TASK_TIMEOUT_SEC + CopyDestrib.DRAIN_TIMEOUT_SEC
+
+
 # ============================================================
 # HELPERS
 # ============================================================
-def creds_hash(cfg: dict) -> str:
+def creds_key(cfg: dict) -> Tuple[str, str, str]:
+    """
+    Идентичность кредов мастера — кортеж, сравнивается напрямую (без md5).
+    """
     ex = cfg.get("exchange", {})
-    key = ex.get("api_key") or ""
-    sec = ex.get("api_secret") or ""
-    proxy = ex.get("proxy") or ""
-    return hashlib.md5(f"{key}:{sec}:{proxy}".encode()).hexdigest()
+    return (
+        ex.get("api_key") or "",
+        ex.get("api_secret") or "",
+        ex.get("proxy") or "",
+    )
 
-async def _stop_task(task: asyncio.Task | None):
+async def _stop_task(task: asyncio.Task | None, timeout: float = STOP_TASK_TIMEOUT_SEC) -> bool:
     """
     Корректная отмена asyncio-задачи.
+    Ждём фактического завершения (не дольше timeout). True — задача завершена.
     """
     if task and not task.done():
         task.cancel()
-        await asyncio.sleep(0)
+        await asyncio.wait((task,), timeout=timeout)
+        return task.done()
+    return True
 
 
 # ============================================================
@@ -87,13 +101,63 @@ class SignalFSM:
         # FSM safety
         self._fsm_lock = asyncio.Lock()
 
+    # --------------------------------------------------------
+    def _spawn(self, coro: Awaitable) -> asyncio.Task:
+        """Задача, чьё завершение (в т.ч. падение) будит supervisor."""
+        task = asyncio.create_task(coro)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self.mc.notify_config_changed()
+
+    # --------------------------------------------------------
+    def _start_aborted(self) -> bool:
+        """STOP (глобальный или из cmd_state) / пауза / падение stream-задачи во время старта."""
+        if self.stop_flag() or (self.stream_task and self.stream_task.done()):
+            return True
+        cmd_state = (self.mc.copy_configs.get(0) or {}).get("cmd_state") or {}
+        return bool(cmd_state.get("stop_flag")) or not cmd_state.get("trading_enabled")
+
+    async def _wait_stream_ready(self, cfg_changed: asyncio.Event) -> bool:
+        """
+        Ждёт ready_event WS вместе с условием остановки (не дольше WS_READY_TIMEOUT_SEC).
+        cfg_changed не сбрасывается — его разбирает следующий проход supervisor.
+        """
+        stream = self.signal_stream
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WS_READY_TIMEOUT_SEC
+        ready_wait = asyncio.ensure_future(stream.ready_event.wait())
+        try:
+            while not stream.ready:
+                if self._start_aborted():
+                    return False
+                left = deadline - loop.time()
+                if left <= 0:
+                    self.logger.error("[FSM] WS start timeout")
+                    return False
+
+                waiters = [ready_wait, self.stream_task]
+                cfg_wait = None
+                if not cfg_changed.is_set():
+                    cfg_wait = asyncio.ensure_future(cfg_changed.wait())
+                    waiters.append(cfg_wait)
+                # короткий слайс: глобальный stop_flag — без события; взведённый cfg_changed не крутит busy-loop
+                await asyncio.wait(waiters, timeout=min(left, WS_READY_POLL_SEC), return_when=asyncio.FIRST_COMPLETED)
+                if cfg_wait:
+                    cfg_wait.cancel()
+            return True
+        finally:
+            ready_wait.cancel()
+
     # --------------------------------------------------------
     def _reset_master_state(self):
         """
         Полный reset PV мастера.
         Вызывается ТОЛЬКО при HARD STOP или RELOAD.
         """
-        Utils.clear_runtime_positions(pos_vars_root=self.mc.pos_vars_root)        
+        Utils.clear_runtime_positions(pos_vars_root=self.mc.pos_vars_root)
+        self.mc.pos_vars_version += 1   # PV пересобраны → ссылки в кэшах недействительны
 
     # ========================================================
     # MAIN SUPERVISOR LOOP
@@ -102,10 +166,16 @@ class SignalFSM:
     async def master_supervisor(self):
         self.logger.info("[FSM] Master supervisor started")
 
-        last_hash: Optional[str] = None
+        last_key: Optional[Tuple[str, str, str]] = None
+        cfg_changed = self.mc.cfg_changed_event()
 
         while not self.stop_flag():
-            await asyncio.sleep(0.05)
+            # ждём изменения конфигов / завершения задач; таймаут — страховочная проверка здоровья
+            try:
+                await asyncio.wait_for(cfg_changed.wait(), timeout=SUPERVISOR_IDLE_SEC)
+            except asyncio.TimeoutError:
+                pass
+            cfg_changed.clear()
 
             async with self._fsm_lock:
 
@@ -130,21 +200,24 @@ class SignalFSM:
                         self.signal_stream.stop()
                     self.signal_stream = None
 
-                    await _stop_task(self.stream_task)
-                    await _stop_task(self.payload_task)
+                    if self.copy_loop_task:
+                        self.copy.stop_signal_loop()
+
+                    await asyncio.gather(
+                        _stop_task(self.stream_task),
+                        _stop_task(self.payload_task),
+                        _stop_task(self.copy_loop_task, COPY_STOP_TIMEOUT_SEC),
+                        return_exceptions=True,
+                    )
 
                     if self.payload:
                         self.payload.stop()
                     self.mc.master_payload = None
                     self.payload = None
-
-                    if self.copy_loop_task:
-                        self.copy.stop_signal_loop()
-                        await _stop_task(self.copy_loop_task)
                     self.copy_loop_task = None
 
                     self._reset_master_state()
-                    last_hash = None
+                    last_key = None
 
                     await asyncio.sleep(0.3)
                     continue
@@ -163,13 +236,13 @@ class SignalFSM:
                     await asyncio.sleep(0.3)
                     continue
 
-                cur_hash = creds_hash(master_cfg)
+                cur_key = creds_key(master_cfg)
 
                 # ==================================================
                 # RUNNING, SAME CREDS
                 # ==================================================
                 if (
-                    cur_hash == last_hash
+                    cur_key == last_key
                     and self.stream_task
                     and not self.stream_task.done()
                 ):
@@ -184,11 +257,14 @@ class SignalFSM:
                 # ---- stop old ----
                 if self.signal_stream:
                     self.signal_stream.stop()
-                await _stop_task(self.stream_task)
-
                 if self.payload:
                     self.payload.stop()
-                await _stop_task(self.payload_task)
+
+                await asyncio.gather(
+                    _stop_task(self.stream_task),
+                    _stop_task(self.payload_task),
+                    return_exceptions=True,
+                )
 
                 self._reset_master_state()
 
@@ -206,19 +282,12 @@ class SignalFSM:
                 )
                 self.logger.wrap_object_methods(self.signal_stream)
 
-                self.stream_task = asyncio.create_task(
+                self.stream_task = self._spawn(
                     self.signal_stream.start()
                 )
 
-                # ---- WAIT READY (с таймаутом) ----
-                t0 = now()
-                while not self.stop_flag():
-                    if self.signal_stream.ready:
-                        break
-                    if now() - t0 > 15000:
-                        self.logger.error("[FSM] WS start timeout")
-                        break
-                    await asyncio.sleep(0.05)
+                # ---- WAIT READY (с таймаутом, прерывается STOP) ----
+                await self._wait_stream_ready(cfg_changed)
 
                 if not self.signal_stream.ready:
                     await asyncio.sleep(0.5)
@@ -235,7 +304,7 @@ class SignalFSM:
                 )
                 self.mc.master_payload = self.payload   # 👈 ВОТ ОНО
 
-                self.payload_task = asyncio.create_task(
+                self.payload_task = self._spawn(
                     self.payload.run()
                 )
 
@@ -244,14 +313,15 @@ class SignalFSM:
                 # ---- COPY LOOP (FORCE RESTART ON CREDS CHANGE) ----
                 if self.copy_loop_task:
                     self.copy.stop_signal_loop()
-                    await _stop_task(self.copy_loop_task)
+                    if not await _stop_task(self.copy_loop_task, COPY_STOP_TIMEOUT_SEC):
+                        self.logger.warning("[FSM] old copy loop still finishing on restart")
                     self.copy_loop_task = None
 
-                self.copy_loop_task = asyncio.create_task(
+                self.copy_loop_task = self._spawn(
                     self.copy.signal_loop()
                 )
 
-                last_hash = cur_hash
+                last_key = cur_key
                 self.logger.info("[FSM] ENTER RUNNING")
 
         self.logger.info("[FSM] EXIT")
\ No newline at end of file
@@ -2,33 +2,35 @@
 from __future__ import annotations
 
 import asyncio
+import sys
 from dataclasses import dataclass, field
 from collections import deque
+from functools import lru_cache
 from typing import *
 from b_context import PosVarTemplate
-from c_utils import Utils
+from c_utils import Utils, DC_SLOTS
 
 PosSide = Literal["LONG", "SHORT"]
 
 
+@lru_cache(maxsize=4096)   # набор символов ограничен → нормализация один раз на символ
 def normalize_symbol(raw_symbol: str, quota_asset: str = "USDT") -> str:
     if not raw_symbol:
         return ""
     qa = quota_asset.upper()
     s = raw_symbol.upper().replace("-", "").replace("_", "").replace(" ", "")
-    return s.replace(qa, f"_{qa}")
+    # interned: dict-ключи по символу (pos_vars_root, _last_raw) сравниваются по identity
+    return sys.intern(s.replace(qa, f"_{qa}"))
 
 
-def side_from_order_side(code: int) -> Optional[PosSide]:
-    return (
-        "LONG" if code in (1, 4)
-        else "SHORT" if code in (2, 3)
-        else None
-    )
+# MEXC order side: 1=open long, 2=close short, 3=open short, 4=close long
+_ORDER_SIDE_TO_POS: Dict[int, PosSide] = {1: "LONG", 4: "LONG", 2: "SHORT", 3: "SHORT"}
+# MEXC positionType: 1=long, 2=short
+_POSITION_TYPE_TO_POS: Dict[int, PosSide] = {1: "LONG", 2: "SHORT"}
 
-
-def side_from_position_type(code: int) -> Optional[PosSide]:
-    return "LONG" if code == 1 else "SHORT" if code == 2 else None
+# code → PosSide | None (bound dict.get — без Python-фрейма на вызов)
+side_from_order_side: Callable[[int], Optional[PosSide]] = _ORDER_SIDE_TO_POS.get
+side_from_position_type: Callable[[int], Optional[PosSide]] = _POSITION_TYPE_TO_POS.get
 
 
 SignalEventType = Literal[
@@ -54,14 +56,58 @@ SignalEventType = Literal[
 ]
 
 
-
-@dataclass
+@dataclass(**DC_SLOTS)
 class SignalEvent:
     symbol: str
     pos_side: Optional[PosSide]
     event_type: SignalEventType
     ts: int
     raw: Dict[str, Any] = field(default_factory=dict)
+    side_code: int = 0   # MEXC order side (1..4), декодирован на входе WS; 0 — нет
+
+
+_intern = sys.intern
+
+
+class SignalEventPool:
+    """
+    Free-list SignalEvent.
+    • acquire — переиспользует инстанс (поля перезаписываются)
+    • release — ТОЛЬКО после _route: ссылка на ev дальше не живёт
+    • пул полон → release просто отпускает объект
+    """
+    MAX_FREE = 2048
+
+    def __init__(self):
+        self._free: List[SignalEvent] = []
+
+    def acquire(
+        self,
+        symbol: str,
+        pos_side: Optional[PosSide],
+        event_type: SignalEventType,
+        ts: int,
+        raw: Dict[str, Any],
+        side_code: int = 0,
+    ) -> SignalEvent:
+        # единственная точка создания событий: event_type всегда interned → dict-dispatch в _route по identity
+        event_type = _intern(event_type)
+        free = self._free
+        if not free:
+            return SignalEvent(symbol, pos_side, event_type, ts, raw, side_code)
+        ev = free.pop()
+        ev.symbol = symbol
+        ev.pos_side = pos_side
+        ev.event_type = event_type
+        ev.ts = ts
+        ev.raw = raw
+        ev.side_code = side_code
+        return ev
+
+    def release(self, ev: SignalEvent):
+        if len(self._free) < self.MAX_FREE:
+            ev.raw = None   # не держим WS payload в пуле
+            self._free.append(ev)
 
 
 class SignalCache:
@@ -76,38 +122,45 @@ class SignalCache:
         self._events: Deque[SignalEvent] = deque()
         self._last_raw: Dict[Tuple[str, PosSide], Dict[str, Any]] = {}
 
-        self._lock = asyncio.Lock()
+        # один event loop → lock не нужен (append / swap без await)
         self._event_notify = asyncio.Event()
 
-    async def push_event(self, ev: SignalEvent):
-        async with self._lock:
-            self._events.append(ev)
-            if ev.pos_side:
-                self._last_raw[(ev.symbol, ev.pos_side)] = ev.raw
-            self._event_notify.set()   # ← КРИТИЧЕСКИ ВАЖНО
+        # общий пул: stream → acquire, MasterPayload → release
+        self.pool = SignalEventPool()
+
+    def push_event(self, ev: SignalEvent):
+        self._events.append(ev)
+        if ev.pos_side:
+            self._last_raw[(ev.symbol, ev.pos_side)] = ev.raw
+        self._event_notify.set()   # ← КРИТИЧЕСКИ ВАЖНО
 
-    async def pop_events(self) -> list[SignalEvent]:
-        async with self._lock:
-            out = list(self._events)
-            self._events.clear()
-            self._event_notify.clear()
-            return out
+    def pop_events(self) -> Deque[SignalEvent]:
+        out = self._events
+        self._events = deque()
+        self._event_notify.clear()
+        return out
 
     def get_last_raw(self, symbol: str, side: PosSide) -> Optional[Dict[str, Any]]:
         return self._last_raw.get((symbol, side))
     
 
 class PosVarSetup():
-    @staticmethod
-    def pos_vars_root_template():
-        pv = PosVarTemplate.base_template()
-        pv.update({
-            "_pending_buy": False,
-            "_last_exec_source": None,
-            "_attached_tp": None,
-            "_attached_sl": None,
-        })
-        return pv
+    # прототип PV: только иммутабельные значения → shallow copy безопасен
+    _PROTOTYPE: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def pos_vars_root_template(cls):
+        proto = cls._PROTOTYPE
+        if proto is None:
+            proto = PosVarTemplate.base_template()
+            proto.update({
+                "_pending_buy": False,
+                "_last_exec_source": None,
+                "_attached_tp": None,
+                "_attached_sl": None,
+            })
+            cls._PROTOTYPE = proto
+        return proto.copy()
 
     @staticmethod
     def set_pos_defaults(
@@ -119,14 +172,17 @@ class PosVarSetup():
     ) -> Dict[str, Dict[str, Any]] | bool:
         """
         Безопасная инициализация структуры данных контроля позиций.
+        reset_flag подменяет PV dict — вызывающий поднимает mc.pos_vars_version (кэши ссылок).
         """
 
-        if symbol not in position_vars:
-            position_vars[symbol] = {}
+        sym = position_vars.get(symbol)
+        if sym is None:
+            # interned: ключи совпадают по identity с символами из снапшотов
+            sym = position_vars[sys.intern(symbol)] = {}
 
         # -------- SPEC --------
         specs = {}
-        if instruments_data and "spec" not in position_vars[symbol]:
+        if instruments_data and "spec" not in sym:
             try:
                 specs = Utils.parse_precision(
                     symbols_info=instruments_data,
@@ -140,10 +196,10 @@ class PosVarSetup():
             except Exception as e:
                 print(f"⚠️ [ERROR] при получении инструментов для {symbol}: {e}")
 
-            position_vars[symbol]["spec"] = specs
+            sym["spec"] = specs
 
         # -------- SIDE INIT --------
-        if pos_side not in position_vars[symbol] or reset_flag:
-            position_vars[symbol][pos_side] = PosVarSetup.pos_vars_root_template()
+        if reset_flag or pos_side not in sym:
+            sym[pos_side] = PosVarSetup.pos_vars_root_template()
 
         return position_vars
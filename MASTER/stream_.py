@@ -4,7 +4,6 @@ from __future__ import annotations
 
 import asyncio
 import aiohttp
-import json
 import time
 import hmac
 import hashlib
@@ -12,11 +11,17 @@ import random
 from typing import *
 from pprint import pprint
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson опционален
+    import json
+    _loads = json.loads
+
 from a_config import BLACK_SYMBOLS
 
 from c_utils import now, Utils
 from .state_ import (
-    SignalEvent,
     normalize_symbol,
     side_from_order_side,
     side_from_position_type,
@@ -29,6 +34,18 @@ if TYPE_CHECKING:
 
 IS_SHOW_SIGNAL = False
 
+_WS_DEAD = frozenset((
+    aiohttp.WSMsgType.CLOSE,
+    aiohttp.WSMsgType.CLOSING,
+    aiohttp.WSMsgType.CLOSED,
+    aiohttp.WSMsgType.ERROR,
+))
+
+# общий префикс всех обрабатываемых каналов (см. _dispatch)
+_PUSH_MARK = "push.personal."
+
+WS_READ_BUFSIZE = 2 ** 17   # крупные кадры позиций/ордеров читаются за меньшее число recv()
+
 
 class MasterSignalStream:
     """
@@ -51,8 +68,10 @@ class MasterSignalStream:
     ):
         self.api_key = api_key
         self.api_secret = api_secret
+        self._hmac_template = hmac.new(api_secret.encode("utf-8"), b"", hashlib.sha256)
 
         self.cache = signal_cache
+        self._acquire_event = signal_cache.pool.acquire   # SignalEvent из пула кэша
         self.logger = logger
 
         self.proxy_url = None if not proxy_url or proxy_url == "0" else proxy_url
@@ -63,6 +82,7 @@ class MasterSignalStream:
         self.websocket: Optional[aiohttp.ClientWebSocketResponse] = None
 
         self.ready = False
+        self.ready_event = asyncio.Event()   # supervisor ждёт его вместо поллинга ready
         self.is_connected = False
         self.ping_interval = 12
         self.stop_flag = stop_flag
@@ -70,33 +90,53 @@ class MasterSignalStream:
         self._external_stop = False
         self._ping_task: Optional[asyncio.Task] = None
 
-        self.black_symbols = {x.upper() for x in BLACK_SYMBOLS if x and x.strip()}
+        self.black_symbols = frozenset(x.upper() for x in BLACK_SYMBOLS if x and x.strip())
+
+        # channel → handler (один dict lookup на кадр)
+        # handlers синхронные: push в SignalCache без await → без корутины на событие
+        self._dispatch: Dict[str, Callable[[dict], None]] = {
+            "push.personal.order": self._handle_order,
+            "push.personal.order.deal": self._handle_order_deal,
+            "push.personal.position": self._handle_position,
+            "push.personal.plan.order": self._handle_plan_order,
+            "push.personal.stop.order": self._handle_stop_order,
+        }
 
     # --------------------------------------------------
     # LIFECYCLE
     # --------------------------------------------------
 
+    def _set_ready(self, flag: bool):
+        self.ready = flag
+        if flag:
+            self.ready_event.set()
+        else:
+            self.ready_event.clear()
+
     def stop(self):
         self._external_stop = True
-        self.ready = False
+        self._set_ready(False)
         self.logger.info("MasterSignalStream: stop requested")
 
     # --------------------------------------------------
     def _signature(self, ts_ms: int) -> str:
         payload = f"{self.api_key}{ts_ms}"
-        return hmac.new(
-            self.api_secret.encode("utf-8"),
-            payload.encode("utf-8"),
-            hashlib.sha256
-        ).hexdigest()
+        # copy() готового ключевого контекста — без повторного key-padding
+        m = self._hmac_template.copy()
+        m.update(payload.encode("utf-8"))
+        return m.hexdigest()
 
     # --------------------------------------------------
     # CONNECTION
     # --------------------------------------------------
     async def _connect(self) -> bool:
         try:
+            # сессия живёт между reconnect'ами; пересоздаётся только после реального закрытия
             if not self.session or self.session.closed:
-                self.session = aiohttp.ClientSession()
+                self.session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(ttl_dns_cache=300),
+                    read_bufsize=WS_READ_BUFSIZE,
+                )
 
             self.websocket = await self.session.ws_connect(
                 self.ws_url,
@@ -124,7 +164,7 @@ class MasterSignalStream:
         })
 
         msg = await asyncio.wait_for(self.websocket.receive(), timeout=10)
-        data = json.loads(msg.data)
+        data = _loads(msg.data)
 
         if data.get("channel") == "rs.login" and data.get("data") == "success":
             self.logger.info("MasterSignalStream: WS login success")
@@ -143,7 +183,7 @@ class MasterSignalStream:
 
     async def _disconnect(self):
         self.is_connected = False
-        self.ready = False
+        self._set_ready(False)
 
         if self._ping_task and not self._ping_task.done():
             self._ping_task.cancel()
@@ -151,41 +191,39 @@ class MasterSignalStream:
         try:
             if self.websocket:
                 await self.websocket.close()
-            if self.session:
-                await self.session.close()
         except Exception:
             pass
 
         self.websocket = None
-        self.session = None
         self.logger.info("MasterSignalStream: WS disconnected")
 
+    async def _close_session(self):
+        try:
+            if self.session:
+                await self.session.close()
+        except Exception:
+            pass
+        self.session = None
+
     # --------------------------------------------------
     # RAW EVENT EMIT
     # --------------------------------------------------
-    async def _emit(self, symbol, pos_side, etype, raw):
-        if symbol and symbol.upper() in self.black_symbols:
-            return
-             
-        ev = SignalEvent(
-            symbol=symbol,
-            pos_side=pos_side,
-            event_type=etype,
-            ts=now(),
-            raw=raw,
-        )
+    def _emit(self, symbol, pos_side, etype, raw, side_code: int = 0):
+        # black_symbols отфильтрованы ещё в _handle_messages
+        ev = self._acquire_event(symbol, pos_side, etype, now(), raw, side_code)
         # pprint(ev)
         if IS_SHOW_SIGNAL:
             self.logger.debug(f"RAW SIGNAL: {ev}")
-        await self.cache.push_event(ev)
+        self.cache.push_event(ev)
 
-    async def _handle_order(self, data: dict):
-        symbol = normalize_symbol(data.get("symbol"), self.quota_asset)
-        side_code = int(data.get("side", 0))
+    def _handle_order(self, data: dict):
+        get = data.get
+        symbol = normalize_symbol(get("symbol"), self.quota_asset)
+        side_code = int(get("side", 0))
         side = side_from_order_side(side_code)
 
-        state = int(data.get("state", 0))
-        order_type = int(data.get("orderType", 0))
+        state = int(get("state", 0))
+        order_type = int(get("orderType", 0))
 
         # print(
         #     "[ORDER]",
@@ -197,7 +235,7 @@ class MasterSignalStream:
 
         # ---------------- TERMINAL ----------------
         if state in (4, 5):
-            await self._emit(
+            self._emit(
                 symbol,
                 side,
                 "order_cancelled" if state == 4 else "order_invalid",
@@ -208,24 +246,24 @@ class MasterSignalStream:
         # ---------------- EXECUTION ----------------
         if state == 3:
             if order_type == 1:
-                await self._emit(symbol, side, "limit_filled", data)
+                self._emit(symbol, side, "limit_filled", data)
             elif order_type == 5:
-                await self._emit(symbol, side, "market_filled", data)
+                self._emit(symbol, side, "market_filled", data)
             else:
-                await self._emit(symbol, side, "trigger_filled", data)
+                self._emit(symbol, side, "trigger_filled", data, side_code)
             return
 
         # ---------------- INTENT ----------------
         if order_type == 1 and state == 2:
-            await self._emit(symbol, side, "limit_placed", data)
+            self._emit(symbol, side, "limit_placed", data)
             return
 
-    async def _handle_order_deal(self, data):
+    def _handle_order_deal(self, data):
         symbol = normalize_symbol(data.get("symbol"), self.quota_asset)
         side = side_from_order_side(int(data.get("side", 0)))
-        await self._emit(symbol, side, "deal", data)
+        self._emit(symbol, side, "deal", data)
 
-    async def _handle_position(self, data):
+    def _handle_position(self, data):
         symbol = normalize_symbol(data.get("symbol"), self.quota_asset)
         side = side_from_position_type(int(data.get("positionType", 0)))
 
@@ -237,9 +275,9 @@ class MasterSignalStream:
             if (state in (1, 2) and hold_vol > 0)
             else "position_closed"
         )
-        await self._emit(symbol, side, etype, data)
+        self._emit(symbol, side, etype, data)
 
-    async def _handle_plan_order(self, data):
+    def _handle_plan_order(self, data):
         symbol = normalize_symbol(data.get("symbol"), self.quota_asset)
         side = side_from_order_side(int(data.get("side", 0)))
         state = int(data.get("state", 0))
@@ -251,14 +289,14 @@ class MasterSignalStream:
             if state == 3
             else "plan_cancelled"
         )
-        await self._emit(symbol, side, etype, data)
+        self._emit(symbol, side, etype, data)
 
-    async def _handle_stop_order(self, data):
+    def _handle_stop_order(self, data):
         # pprint("_handle_stop_order")
         symbol = normalize_symbol(data.get("symbol"), self.quota_asset)
         side = side_from_order_side(int(data.get("side", 0)))
 
-        await self._emit(
+        self._emit(
             symbol,
             side,
             "oco_attached",   # ⬅️ вместо stop_attached
@@ -273,29 +311,41 @@ class MasterSignalStream:
     # --------------------------------------------------
 
     async def _handle_messages(self):
+        dispatch = self._dispatch
+        black = self.black_symbols
+        quota_asset = self.quota_asset
+        # timeout самого aiohttp — без отдельной Task от wait_for на каждый кадр
+        receive = self.websocket.receive
+
         while not self._external_stop and not self.stop_flag():
             try:
-                msg = await asyncio.wait_for(self.websocket.receive(), timeout=1.0)
+                msg = await receive(timeout=1.0)
             except asyncio.TimeoutError:
                 continue
 
             if msg.type != aiohttp.WSMsgType.TEXT:
+                # закрытый сокет отдаёт CLOSED мгновенно — выходим на reconnect, а не крутимся
+                if msg.type in _WS_DEAD:
+                    break
+                continue
+
+            raw = msg.data
+            # pong / служебные кадры отсекаются по сырому тексту — без json-разбора
+            if _PUSH_MARK not in raw:
+                continue
+
+            data = _loads(raw)
+            handler = dispatch.get(data.get("channel"))
+            if handler is None:
                 continue
 
-            data = json.loads(msg.data)
-            channel = data.get("channel")
             payload = data.get("data", {})
 
-            if channel == "push.personal.order":
-                await self._handle_order(payload)
-            elif channel == "push.personal.order.deal":
-                await self._handle_order_deal(payload)
-            elif channel == "push.personal.position":
-                await self._handle_position(payload)
-            elif channel == "push.personal.plan.order":
-                await self._handle_plan_order(payload)
-            elif channel == "push.personal.stop.order":
-                await self._handle_stop_order(payload)
+            # blacklist — до разбора payload и аллокации события
+            if black and normalize_symbol(payload.get("symbol"), quota_asset) in black:
+                continue
+
+            handler(payload)
 
     # --------------------------------------------------
     # MAIN LOOP
@@ -303,21 +353,24 @@ class MasterSignalStream:
     async def start(self):
         self._external_stop = False
 
-        while not self._external_stop and not self.stop_flag():
-            if not await self._connect():
-                await asyncio.sleep(1)
-                continue
+        try:
+            while not self._external_stop and not self.stop_flag():
+                if not await self._connect():
+                    await asyncio.sleep(1)
+                    continue
 
-            if not await self._login():
-                await self._disconnect()
-                await asyncio.sleep(1)
-                continue
+                if not await self._login():
+                    await self._disconnect()
+                    await asyncio.sleep(1)
+                    continue
 
-            self.ready = True
-            self._ping_task = asyncio.create_task(self._ping_loop())
+                self._set_ready(True)
+                self._ping_task = asyncio.create_task(self._ping_loop())
 
-            await self._handle_messages()
-            await self._disconnect()
+                await self._handle_messages()
+                await self._disconnect()
 
-            if not self._external_stop:
-                await asyncio.sleep(random.uniform(0.8, 1.5))
+                if not self._external_stop:
+                    await asyncio.sleep(random.uniform(0.8, 1.5))
+        finally:
+            await self._close_session()
@@ -1,6 +1,8 @@
 # TG.helpers_.py
 
 from __future__ import annotations
+
+import re
 from typing import *
 
 from a_config import (
@@ -53,6 +55,10 @@ def validate_copy(cfg: Dict):
 # #                  RANGE PARSER FOR DELETE
 # # =====================================================================
 
+# id или диапазон id; поддержка всех видов тире
+_ID_TOKEN_RE = re.compile(r"(\d+)(?:[-–—](\d+))?")
+
+
 def parse_id_range(raw: str, allow_zero: bool = False) -> List[int]:
     """
     Поддерживает форматы (разделитель — ПРОБЕЛ):
@@ -73,43 +79,24 @@ def parse_id_range(raw: str, allow_zero: bool = False) -> List[int]:
     if "," in raw:
         raise ValueError("comma is not allowed")
 
-    tokens = raw.strip().split()
     result: set[int] = set()
 
-    for token in tokens:
-        token = token.strip()
-        if not token:
-            continue
-
-        # поддержка всех видов тире
-        token = token.replace("–", "-").replace("—", "-")
-
-        if "-" in token:
-            try:
-                a_str, b_str = token.split("-", 1)
-                a = int(a_str)
-                b = int(b_str)
-            except Exception:
+    for token in raw.split():
+        m = _ID_TOKEN_RE.fullmatch(token)
+        if m is None:
+            if any(d in token for d in "-–—"):
                 raise ValueError(f"invalid range: {token}")
+            raise ValueError(f"invalid id: {token}")
 
-            lo, hi = sorted((a, b))
-            for cid in range(lo, hi + 1):
-                if cid == 0:
-                    if allow_zero:
-                        result.add(0)
-                elif 1 <= cid <= COPY_NUMBER:
-                    result.add(cid)
-        else:
-            try:
-                cid = int(token)
-            except Exception:
-                raise ValueError(f"invalid id: {token}")
+        a = int(m[1])
+        b = int(m[2]) if m[2] else a
+        lo, hi = (a, b) if a <= b else (b, a)
+
+        if lo == 0 and allow_zero:
+            result.add(0)
 
-            if cid == 0:
-                if allow_zero:
-                    result.add(0)
-            elif 1 <= cid <= COPY_NUMBER:
-                result.add(cid)
+        # сразу в границах [1..COPY_NUMBER] — без перебора всего диапазона
+        result.update(range(max(lo, 1), min(hi, COPY_NUMBER) + 1))
 
     if not result:
         raise ValueError("no valid ids")
@@ -140,8 +127,6 @@ def format_status(cfg: dict) -> str:
     Без HTML. Без fallback-логики. Все секреты замаскированы.
     """
 
-    lines: list[str] = []
-
     # ========================
     # ROLE / ID / NAME
     # ========================
@@ -152,58 +137,58 @@ def format_status(cfg: dict) -> str:
     enabled = bool(cfg.get("enabled", False))
     icon = "🟢" if enabled else "⚪"
 
-    lines.append(f"{icon} Role: {role} (ID={acc_id})")
+    # секции собираются целыми блоками и склеиваются одним join
+    blocks: list[str] = [f"{icon} Role: {role} (ID={acc_id})"]
     if name is not None:
-        lines.append(f"Name: {name}")
+        blocks.append(f"Name: {name}")
 
     # ========================
     # EXCHANGE (ВСЕ МАСКИРОВАНО)
     # ========================
     ex = cfg.get("exchange", {}) or {}
 
-    lines.append("")
-    lines.append("Exchange:")
-    lines.append(f"  • api_key: {_mask_secret(ex.get('api_key'))}")
-    lines.append(f"  • api_secret: {_mask_secret(ex.get('api_secret'))}")
-    lines.append(f"  • uid: {_mask_secret(ex.get('uid'))}")
-    lines.append(f"  • proxy: {_mask_secret(ex.get('proxy'), head=6, tail=9)}")
+    blocks.append(
+        "\nExchange:\n"
+        f"  • api_key: {_mask_secret(ex.get('api_key'))}\n"
+        f"  • api_secret: {_mask_secret(ex.get('api_secret'))}\n"
+        f"  • uid: {_mask_secret(ex.get('uid'))}\n"
+        f"  • proxy: {_mask_secret(ex.get('proxy'), head=6, tail=9)}"
+    )
 
     # ========================
     # RUNTIME (MASTER)
     # ========================
     rt = cfg.get("cmd_state")
     if isinstance(rt, dict):
-        lines.append("")
-        lines.append("Runtime:")
-        for k in sorted(rt):
-            lines.append(f"  • {k}: {rt[k]}")
+        blocks.append("\nRuntime:")
+        blocks.extend(f"  • {k}: {rt[k]}" for k in sorted(rt))
 
     # ========================
     # COPY SETTINGS (ВСЕ ПОЛЯ, None → строка)
     # ========================
     if role == "COPY":
-        lines.append("")
-        lines.append("Copy Settings:")
-        lines.append(f"  • coef: {cfg.get('coef')}")
-        lines.append(f"  • leverage: {cfg.get('leverage')}")
-        lines.append(f"  • margin_mode: {cfg.get('margin_mode')}")
-        lines.append(f"  • max_position_size: {cfg.get('max_position_size')}")
-        lines.append(f"  • random_size_pct: {cfg.get('random_size_pct')}")
-        lines.append(f"  • delay_ms: {cfg.get('delay_ms')}")
-        lines.append(f"  • enabled: {enabled}")
+        blocks.append(
+            "\nCopy Settings:\n"
+            f"  • coef: {cfg.get('coef')}\n"
+            f"  • leverage: {cfg.get('leverage')}\n"
+            f"  • margin_mode: {cfg.get('margin_mode')}\n"
+            f"  • max_position_size: {cfg.get('max_position_size')}\n"
+            f"  • random_size_pct: {cfg.get('random_size_pct')}\n"
+            f"  • delay_ms: {cfg.get('delay_ms')}\n"
+            f"  • enabled: {enabled}"
+        )
 
     # ========================
     # CREATED AT
     # ========================
     ts = cfg.get("created_at")
-    lines.append("")
-    lines.append(
-        f"Created at: {Utils.milliseconds_to_datetime(ts)}"
+    blocks.append(
+        f"\nCreated at: {Utils.milliseconds_to_datetime(ts)}"
         if ts else
-        "Created at: —"
+        "\nCreated at: —"
     )
 
-    return "\n".join(lines)
+    return "\n".join(blocks)
 
 def can_push_cmd(mc: "MainContext") -> bool:
     now_ts = now()
@@ -235,6 +220,10 @@ def _account_fingerprint(cfg: dict) -> Optional[tuple]:
     return (api_key, uid)
 
 
+# (id(copy_configs), copy_configs_version) → dups; один MainContext на процесс
+_dup_cache: Tuple[Optional[tuple], Dict[tuple, List[int]]] = (None, {})
+
+
 def find_duplicate_accounts(
     mc: "MainContext",
 ) -> Dict[tuple, List[int]]:
@@ -245,7 +234,15 @@ def find_duplicate_accounts(
     {
         (api_key, uid): [0, 2, 5]
     }
+
+    Результат кэшируется до следующего mc.copy_configs_version.
     """
+    global _dup_cache
+
+    ver = (id(mc.copy_configs), mc.copy_configs_version)
+    if _dup_cache[0] == ver:
+        return _dup_cache[1]
+
     seen: Dict[tuple, List[int]] = {}
 
     for cid, cfg in mc.copy_configs.items():
@@ -254,9 +251,15 @@ def find_duplicate_accounts(
         fp = _account_fingerprint(cfg)
         if not fp:
             continue
-        seen.setdefault(fp, []).append(cid)
+        ids = seen.get(fp)
+        if ids is None:
+            seen[fp] = [cid]
+        else:
+            ids.append(cid)
 
-    return {fp: ids for fp, ids in seen.items() if len(ids) > 1}
+    dups = {fp: ids for fp, ids in seen.items() if len(ids) > 1}
+    _dup_cache = (ver, dups)
+    return dups
 
 
 def validate_unique_accounts(mc: "MainContext") -> Optional[str]:
@@ -213,6 +213,7 @@ class UIMenu:
         rt["stop_flag"] = False
         rt["stop_confirm"] = False
         rt["trading_enabled"] = True
+        self.ctx.notify_config_changed()
 
         await msg.answer("▶️ Мастер запущен", reply_markup=self.menu_main())
 
@@ -235,6 +236,7 @@ class UIMenu:
         rt["trading_enabled"] = False
         rt["stop_flag"] = True
         rt["stop_confirm"] = False
+        self.ctx.notify_config_changed()
 
         await msg.answer("⏹ Остановка мастера активирована.")
 
@@ -573,6 +575,7 @@ class UIMenu:
                     cfg = self.ctx.copy_configs[cid]
                     cfg["enabled"] = True
                     cfg["created_at"] = now()
+                    self.ctx.touch_copy_configs()
 
                     ok = await self.copy_state.activate_copy(cid)
                     if not ok:
@@ -606,6 +609,7 @@ class UIMenu:
 
                     self.ctx.copy_configs[cid]["enabled"] = False
                     self.ctx.copy_configs[cid]["created_at"] = None
+                    self.ctx.touch_copy_configs()
 
                 await self.ctx.save_users()
                 self._exit_input(chat_id)
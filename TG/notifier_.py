@@ -21,6 +21,18 @@ if TYPE_CHECKING:
     from c_log import UnifiedLogger
 
 
+class IntentDropLog(NamedTuple):
+    """
+    Сырой лог INTENT DROP — строка собирается только при flush.
+    """
+    symbol: str
+    pos_side: str
+    reason: str
+    event: Any
+    method: Any
+    extra: Dict[str, Any]
+
+
 class FormatUILogs:
     """
     UI-only форматирование для Telegram.
@@ -156,6 +168,16 @@ class FormatUILogs:
 
         return "\n".join(lines)
 
+    @staticmethod
+    def format_intent_drop(cid: int, d: IntentDropLog) -> str:
+        text = (
+            f"{d.symbol} {d.pos_side} :: INTENT DROP :: reason={d.reason}"
+            f" :: event={d.event} :: method={d.method}"
+        )
+        if d.extra:
+            text += " :: " + ", ".join(f"{k}={v}" for k, v in d.extra.items())
+        return f"🧾 COPY #{cid}\n{text}"
+
     # ==========================================================
     # FLUSH HELPERS
     # ==========================================================
@@ -167,6 +189,7 @@ class FormatUILogs:
 
         Поддерживает:
         • (cid, MasterEvent)
+        • (cid, IntentDropLog)
         • (cid, str)
         • (cid, dict)
         """
@@ -184,6 +207,13 @@ class FormatUILogs:
                     )
                     continue
 
+                # ---------------- Intent drop ----------------
+                if isinstance(payload, IntentDropLog):
+                    texts.append(
+                        FormatUILogs.format_intent_drop(cid, payload)
+                    )
+                    continue
+
                 # ---------------- Plain string ----------------
                 if isinstance(payload, str):
                     header = "🧾 MASTER" if cid == 0 else f"🧾 COPY #{cid}"
@@ -11,6 +11,7 @@ COPY_NUMBER:          int = 100     # количество копируемых
 BLACK_SYMBOLS:        dict = {}   # черный список монет. {"COIN_USDT",}
 IS_REPORT:            bool = True
 TG_LOG_TTL_MS:        int = 10 * 1000
+TG_LOG_FLUSH_BYTES:   int = 3500     # ранний flush логов в TG при накоплении (лимит сообщения TG — 4096)
 SPEC_TTL:             int = 15 * 1000    #  ms. период обновления инструментов. Важно успеть обновить для новых монет
 SESSION_TTL:          int = 30 * 1000    # ms таймаут на генерацию сессии
 CMD_TTL:              int = 0.25 * 1000     # ms таймаут командной кнопки
@@ -31,6 +32,7 @@ ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID", 0))
 LOG_DEBUG:     bool = True   # необязатльеный уровень логирования
 LOG_INFO:      bool = False    # необязатльеный уровень логирования
 LOG_WARNING:   bool = True    # обязатльеный уровень логирования
+DEBUG_LATENCY: bool = False   # print латентности ордеров (только для отладки — stdio на горячем пути)
 LOG_ERROR:     bool = True    # обязатльеный уровень логирования
 MAX_LOG_LINES: int = 5000     # приблизительный размер длины лог файлов
 
@@ -74,45 +74,51 @@ COPY_TEMPLATE: dict = {
 }
 
 
-COPY_RUNTIME_STATE = {
-    "id": None,
-
-    # ===== NETWORK =====
-    "connector": None,
-    "mc_client": None,
-    "network_ready": False,
-
-    # ===== ERRORS =====
-    "last_error": None,
-    "last_error_ts": None,
-
-    # ===== ORDERS / POSITIONS =====
-    "position_vars": {},  # symbol → side → pv
-    "orders_vars": {},    # symbol → side → ov --- добавил. при закрытии силой по cmd -- сбрасываем. \
-                          # При сигнальной закрытии не трогаем. нужна отдельная станция
-    # "orders" = {
-    # symbol -- pos_side...
-    #     "limit": {
-    #         master_order_id: {
-    #             copy_order_id: None,
-    #             "price": ...,
-    #             "qty": ...,
-    #             "status": "OPEN|CANCELED|FILLED"
-    #         }
-    #     },
-    #     "trigger": {
-    #         master_order_id: {
-    #             copy_order_id: None,
-    #             "trigger_price": ...,
-    #             "qty": ...,
-    #             "status": ...
-    #         }
-    #     }
-    # }
-
-    "cmd_closing": False,
-    "dedup": {},
-}
+def make_runtime_state(cid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Свежий runtime copy-аккаунта. Литерал вместо deepcopy шаблона:
+    вложенные контейнеры создаются заново на каждый вызов.
+    """
+    return {
+        "id": cid,
+
+        # ===== NETWORK =====
+        "connector": None,
+        "mc_client": None,
+        "network_ready": False,
+
+        # ===== ERRORS =====
+        "last_error": None,
+        "last_error_ts": None,
+
+        # ===== ORDERS / POSITIONS =====
+        "position_vars": {},  # symbol → side → pv
+        "open_positions": set(),  # {(symbol, side)} с in_position=True — ведёт PosMonitorFSM.refresh
+        "orders_vars": {},    # (symbol, side) → ov --- добавил. при закрытии силой по cmd -- сбрасываем. \
+                              # При сигнальной закрытии не трогаем. нужна отдельная станция
+        # "orders" = {
+        # symbol -- pos_side...
+        #     "limit": {
+        #         master_order_id: {
+        #             copy_order_id: None,
+        #             "price": ...,
+        #             "qty": ...,
+        #             "status": "OPEN|CANCELED|FILLED"
+        #         }
+        #     },
+        #     "trigger": {
+        #         master_order_id: {
+        #             copy_order_id: None,
+        #             "trigger_price": ...,
+        #             "qty": ...,
+        #             "status": ...
+        #         }
+        #     }
+        # }
+
+        "cmd_closing": False,
+        "dedup": {},
+    }
 
 
 
@@ -153,15 +159,19 @@ class MainContext:
 
         # persistent configs
         self.copy_configs: Dict[int, Dict[str, Any]] = {}
+        self.copy_configs_version: int = 0   # ++ при изменении набора enabled-копий
+        self._cfg_changed: Optional[asyncio.Event] = None   # будит supervisor мастера (создаётся лениво в loop)
 
         # runtime states
         self.pos_vars_root: Dict = {}
+        self.pos_vars_version: int = 0   # ++ при появлении символа / обновлении инструментов / пересборке PV (инвалидирует spec- и PV-кэши)
         self.copy_runtime_states: Dict[int, Dict[str, Any]] = {}
         self.last_cmd_ts: int = 0
         self.cmd_ids: List[int] = [] 
         self.master_payload: Optional[MasterPayload] = None
 
         self.active_copy_ids: Set = set()   
+        self.closed_pending_index: Set[Tuple[int, str, str]] = set()   # (cid, symbol, side) с _state=CLOSED_PENDING
 
         self.tg_notifier: Optional[TelegramNotifier] = None     
 
@@ -195,6 +205,7 @@ class MainContext:
 
         # гарантируем что аккаунты существуют
         self._init_accounts()
+        self.touch_copy_configs()
 
         reason = validate_unique_accounts(self)
         if reason:
@@ -205,8 +216,31 @@ class MainContext:
     #                         SAVING
     # ==================================================================
 
+    def touch_copy_configs(self):
+        """Инвалидирует кэши, построенные по copy_configs (enabled-список и т.п.)."""
+        self.copy_configs_version += 1
+        self.notify_config_changed()
+
+    def cfg_changed_event(self) -> asyncio.Event:
+        """Event изменения конфигов — создаётся внутри работающего loop."""
+        if self._cfg_changed is None:
+            self._cfg_changed = asyncio.Event()
+        return self._cfg_changed
+
+    def notify_config_changed(self):
+        """Будит supervisor мастера (cmd_state / креды / enabled)."""
+        if self._cfg_changed is not None:
+            self._cfg_changed.set()
+
+    def drop_closed_pending(self, cid: int):
+        """Снимает CLOSED_PENDING-ключи cid (runtime уничтожен / копия выключена). Set мутируется на месте."""
+        idx = self.closed_pending_index
+        if idx:
+            idx.difference_update([k for k in idx if k[0] == cid])
+
     async def save_users(self):
         """Простая запись JSON без атомарных извращений: монопроцессный бот."""
+        self.touch_copy_configs()
         try:
             with open(COPIES_JSON_PATH, "w", encoding="utf-8") as f:
                 json.dump(self.copy_configs, f, ensure_ascii=False, indent=2)
@@ -42,6 +42,12 @@ class NetworkManager:
     PING_FAIL_THRESHOLD = 3
     PING_RETRY_DELAY = 0.15
 
+    # keep-alive пул: все REST-запросы аккаунта идут на один хост MEXC
+    POOL_LIMIT = 300
+    POOL_LIMIT_PER_HOST = 75
+    DNS_CACHE_TTL = 600         # sec
+    KEEPALIVE_TIMEOUT = 60      # sec
+
     def __init__(
         self,
         logger: "UnifiedLogger",
@@ -70,17 +76,27 @@ class NetworkManager:
     # --------------------------------------------------
     # SESSION
     # --------------------------------------------------
+    def _pooled_connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=self.POOL_LIMIT,
+            limit_per_host=self.POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+        )
+
     async def initialize_session(self) -> None:
         if self.session and not self.session.closed:
             return
 
-        timeout = aiohttp.ClientTimeout(total=30)
+        timeout = aiohttp.ClientTimeout(total=30, connect=3, sock_read=8)
 
         # ==================================================
         # MODE 2 — SIMPLE / STABLE (РЕКОМЕНДУЕМЫЙ)
         # ==================================================
         if self.mode == "simple":
             self.session = aiohttp.ClientSession(
+                connector=self._pooled_connector(),
                 timeout=timeout,
                 proxy=self.proxy_url,      # None = direct
                 trust_env=False,
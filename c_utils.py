@@ -6,11 +6,15 @@ from datetime import datetime
 from a_config import PRECISION, QUOTA_ASSET
 from c_log import TZ
 from decimal import Decimal, getcontext
+import sys
 import time
 
 
 getcontext().prec = PRECISION  # точность Decimal
 
+# slots=True доступен с 3.10; на 3.8 — обычный dataclass
+DC_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 
 def now() -> int:
     """Return current timestamp in milliseconds."""
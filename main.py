@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import sys
 from typing import *
 # from aiogram import Bot, Dispatcher
 
@@ -163,6 +164,7 @@ class CoreApp:
                 )
                 if data:
                     self.mc.instruments_data = data
+                    self.mc.pos_vars_version += 1
                     return
             except Exception as e:
                 self.logger.warning(f"Spec fetch failed: {e}")
@@ -324,7 +326,28 @@ class CoreApp:
 # ==========================================================================
 # ENTRYPOINT
 # ==========================================================================
+def install_uvloop() -> bool:
+    """
+    uvloop (libuv) вместо стандартного loop — WS / aiohttp I/O быстрее.
+    Опционален: нет пакета или Windows → стандартный asyncio.
+    """
+    if sys.platform.startswith("win"):
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
 async def main():
+    # Python 3.12+: короткие таски исполняются синхронно до первого реального await.
+    # На 3.8 (деплой) фабрики нет — остаётся стандартная.
+    eager_factory = getattr(asyncio, "eager_task_factory", None)
+    if eager_factory is not None:
+        asyncio.get_running_loop().set_task_factory(eager_factory)
+
     app = CoreApp()
     try:
         await app.run()
@@ -336,6 +359,7 @@ async def main():
 
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())
 
 